@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+from loader import MONTHS
+
+
+# Dense (years x 12) matrix from the long Year/Month/Precipitation frame; missing months are NaN
+def month_matrix(monthly_data):
+    years, rows = np.unique(monthly_data["Year"].to_numpy(), return_inverse=True)
+    months = pd.Categorical(monthly_data["Month"], categories=MONTHS).codes
+    matrix = np.full((len(years), len(MONTHS)), np.nan)
+    matrix[rows, months] = monthly_data["Precipitation"].to_numpy(dtype=float)
+    return matrix, years
+
+
+def membership_matrix(groups):
+    """
+    0/1 membership of the months of the previous and the current year in each group.
+
+    Groups are listed in chronological order; where the month index goes back (e.g.
+    December -> January in the Sep-Jun group) the earlier months belong to the
+    previous calendar year, so the group is attributed to the hydrological year it
+    ends in.
+
+    :param groups: List of month-name lists.
+    :return: Array of shape (24, groups); rows 0-11 are the previous year's months.
+    """
+    membership = np.zeros((2 * len(MONTHS), len(groups)))
+    for g, group in enumerate(groups):
+        months = np.array([MONTHS.index(m) for m in group])
+        wraps = np.flatnonzero(np.diff(months) < 0)
+        previous_year = np.arange(len(months)) <= (wraps[-1] if len(wraps) else -1)
+        membership[np.where(previous_year, months, months + len(MONTHS)), g] = 1
+    return membership
+
+
+def group_totals(precipitation, groups, years=None):
+    """
+    Totals of any set of month groups as one matrix multiply.
+
+    :param precipitation: Array (..., years, 12) of monthly totals.
+    :param groups: List of month-name lists (see membership_matrix).
+    :param years: Integer year of every row. Rows are first placed on the contiguous
+                  year range (missing years are NaN), so cross-year groups never take
+                  their early months from a year that is not the previous one; without
+                  years the rows are assumed to be consecutive years.
+    :return: Array (..., years, groups); a total is NaN when one of its months is
+             missing, including cross-year groups in the first year.
+    """
+    precipitation = np.asarray(precipitation, dtype=float)
+    if years is not None:
+        offsets = np.asarray(years, dtype=int) - np.min(years)
+        contiguous = np.full(precipitation.shape[:-2] + (offsets.max() + 1, len(MONTHS)), np.nan)
+        contiguous[..., offsets, :] = precipitation
+        return group_totals(contiguous, groups)[..., offsets, :]
+
+    previous = np.full_like(precipitation, np.nan)
+    previous[..., 1:, :] = precipitation[..., :-1, :]
+    both_years = np.concatenate([previous, precipitation], axis=-1)
+
+    membership = membership_matrix(groups)
+    missing = np.isnan(both_years)
+    totals = np.where(missing, 0.0, both_years) @ membership
+    return np.where(missing.astype(float) @ membership > 0, np.nan, totals)
@@ -0,0 +1,78 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+from fitting import fit, fit_mixed, mixed_ppf, ppf
+
+DEFAULT_REPLICATES = 10_000
+
+
+# Fit every bootstrap replicate at once from a single (replicates x n) index array
+# (zero_inflated returns (q, params) from fitting.fit_mixed instead of params); refine
+# must match the fit of the central curve so the band surrounds it
+def bootstrap_params(values, distribution, replicates=DEFAULT_REPLICATES, seed=None, zero_inflated=False,
+                     refine=False):
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    rng = np.random.default_rng(seed)
+    index = rng.integers(0, len(values), size=(replicates, len(values)))
+    if zero_inflated:
+        return fit_mixed(values[index], distribution, refine=refine)
+    return fit(values[index], distribution, refine=refine)
+
+
+def quantile_band(values, distribution, probabilities, replicates=DEFAULT_REPLICATES,
+                  confidence=0.95, seed=None, zero_inflated=False, refine=False):
+    """
+    Bootstrap confidence band of the fitted quantile curve.
+
+    Replicates are refitted with the vectorized estimators in fitting.fit, so all
+    replicates are fitted in one call.
+
+    :param values: Sample of one series.
+    :param distribution: "log-normal", "normal" or "gumbel".
+    :param probabilities: Non-exceedance probabilities where the band is evaluated.
+    :param replicates: Number of bootstrap resamples B.
+    :param confidence: Width of the band, e.g. 0.95 for the 2.5% - 97.5% interval.
+    :param seed: Seed for numpy.random.default_rng.
+    :param zero_inflated: Refit q and G of the zero-inflated H(x) = q + (1 - q) G(x) per replicate.
+    :param refine: Refine the replicate fits to the maximum likelihood estimate; use the
+                   same setting as the central curve (the scripts fit with refine=True).
+    :return: (lower, upper) arrays with the shape of probabilities.
+    """
+    probabilities = np.clip(np.asarray(probabilities, dtype=float), 1e-6, 1 - 1e-6)
+    if zero_inflated:
+        q, params = bootstrap_params(values, distribution, replicates, seed, zero_inflated=True, refine=refine)
+        quantiles = mixed_ppf(probabilities, q, params, distribution)
+    else:
+        params = bootstrap_params(values, distribution, replicates, seed, refine=refine)
+        quantiles = ppf(probabilities, params, distribution)
+    alpha = (1 - confidence) / 2
+    lower, upper = np.nanpercentile(quantiles, [100 * alpha, 100 * (1 - alpha)], axis=0)
+    return lower, upper
+
+
+def _band_job(job, distribution, replicates, confidence, seed, zero_inflated, refine):
+    values, probabilities = job
+    return quantile_band(values, distribution, probabilities, replicates, confidence, seed, zero_inflated, refine)
+
+
+def bootstrap_bands(series, distribution, probabilities, replicates=DEFAULT_REPLICATES,
+                    confidence=0.95, seed=None, workers=None, zero_inflated=False, refine=False):
+    """
+    Confidence bands for many series, spread over a process pool.
+
+    :param series: List of samples, one per station (lengths may differ).
+    :param probabilities: Shared probabilities, or a list with one array per series.
+    :param workers: Number of worker processes (None uses all cores, 1 runs serially).
+    :return: List of (lower, upper) pairs in the order of series.
+    """
+    if np.ndim(probabilities[0]) == 0:
+        probabilities = [probabilities] * len(series)
+    jobs = list(zip(series, probabilities))
+    band = partial(_band_job, distribution=distribution, replicates=replicates,
+                   confidence=confidence, seed=seed, zero_inflated=zero_inflated, refine=refine)
+    if workers == 1 or len(jobs) <= 1:
+        return [band(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(band, jobs, chunksize=max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))))
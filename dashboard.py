@@ -0,0 +1,195 @@
+import base64
+import glob
+import html
+import json
+import os
+import re
+import numpy as np
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
+from plotly.utils import PlotlyJSONEncoder
+from rendering import PLOTLYJS_FILE, write_plotlyjs
+
+# Typed array names understood by the page decoder (same spec plotly.js uses for "bdata")
+TYPED_ARRAYS = {"f8": "Float64Array", "f4": "Float32Array", "i4": "Int32Array", "i2": "Int16Array",
+                "i1": "Int8Array", "u4": "Uint32Array", "u2": "Uint16Array", "u1": "Uint8Array"}
+
+
+def _typed_array(values):
+    if values.dtype.kind == "b":
+        values = values.astype("u1")
+    elif values.dtype.kind in "iu" and values.dtype.itemsize == 8:
+        info = np.iinfo(np.int32)
+        in_range = values.size == 0 or (values.min() >= info.min and values.max() <= info.max)
+        values = values.astype("i4" if in_range else "f8")
+    dtype = values.dtype.newbyteorder("<").str[1:]
+    if dtype not in TYPED_ARRAYS:
+        values = values.astype("f8")
+        dtype = "f8"
+    encoded = {"dtype": dtype, "bdata": base64.b64encode(values.astype("<" + dtype).tobytes()).decode("ascii")}
+    if values.ndim > 1:
+        encoded["shape"] = list(values.shape)
+    return encoded
+
+
+# Replace numeric arrays in a figure dictionary with base64 typed arrays
+def encode_arrays(obj):
+    if isinstance(obj, dict):
+        return {key: encode_arrays(value) for key, value in obj.items()}
+    if isinstance(obj, np.ndarray) and obj.ndim == 0:
+        return obj.item()
+    if isinstance(obj, (list, tuple, np.ndarray)):
+        values = np.asarray(obj) if len(obj) else None
+        if values is not None and values.dtype.kind in "biuf":
+            return _typed_array(values)
+        return [encode_arrays(value) for value in obj]
+    return obj
+
+
+def _slug(name):
+    return re.sub(r"[^A-Za-z0-9]+", "-", name).strip("-").lower()
+
+
+def add_section(report_dir, section, figures):
+    """
+    Stores the figures of one script as a section of the station report.
+
+    :param report_dir: Directory holding the report of one station.
+    :param section: Section (tab) name, e.g. "SPI".
+    :param figures: List of (title, plotly figure) pairs, shown in a dropdown.
+    :return: Path of the section file.
+    """
+    os.makedirs(os.path.join(report_dir, "sections"), exist_ok=True)
+    section_file = os.path.join(report_dir, "sections", f"{_slug(section)}.json")
+    payload = {"name": section, "templates": [], "figures": []}
+
+    # Layout templates are stored once per section instead of once per figure
+    templates = {}
+    for title, fig in figures:
+        figure = encode_arrays(fig.to_plotly_json())
+        template = figure.get("layout", {}).pop("template", None)
+        entry = {"title": title, "figure": figure}
+        if template is not None:
+            key = json.dumps(template, cls=PlotlyJSONEncoder, sort_keys=True)
+            if key not in templates:
+                templates[key] = len(payload["templates"])
+                payload["templates"].append(template)
+            entry["template"] = templates[key]
+        payload["figures"].append(entry)
+    with open(section_file, "w", encoding="utf-8") as f:
+        json.dump(payload, f, cls=PlotlyJSONEncoder, separators=(",", ":"))
+    return section_file
+
+
+_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+{plotlyjs}
+<style>
+body {{ font-family: sans-serif; margin: 0; }}
+header {{ padding: 8px 16px; background: #f4f4f4; border-bottom: 1px solid #ddd; }}
+.tab {{ border: 1px solid #ccc; background: #fff; padding: 6px 12px; cursor: pointer; }}
+.tab.active {{ background: #444; color: #fff; }}
+select {{ margin-left: 16px; padding: 4px; }}
+#plot {{ width: 100%; height: calc(100vh - 60px); }}
+</style>
+</head>
+<body>
+<header><strong>{title}</strong> <span id="tabs"></span><select id="figures"></select></header>
+<div id="plot"></div>
+{sections}
+<script>
+const TYPED = {typed};
+const sections = Array.from(document.querySelectorAll("script.section"));
+let current = null;
+
+function decode(obj) {{
+  if (Array.isArray(obj)) return obj.map(decode);
+  if (obj && typeof obj === "object") {{
+    if ("bdata" in obj && "dtype" in obj) {{
+      const bytes = Uint8Array.from(atob(obj.bdata), c => c.charCodeAt(0));
+      const flat = new window[TYPED[obj.dtype]](bytes.buffer);
+      if (!obj.shape) return flat;
+      const rows = [], width = obj.shape[obj.shape.length - 1];
+      for (let i = 0; i < flat.length; i += width) rows.push(flat.subarray(i, i + width));
+      return rows;
+    }}
+    const out = {{}};
+    for (const key in obj) out[key] = decode(obj[key]);
+    return out;
+  }}
+  return obj;
+}}
+
+// Figures stay as JSON text until they are selected
+function show(index) {{
+  const entry = current.figures[index];
+  const figure = decode(entry.figure);
+  const layout = figure.layout || {{}};
+  if (entry.template !== undefined) layout.template = current.templates[entry.template];
+  Plotly.react("plot", figure.data, layout, {{responsive: true}});
+}}
+
+function selectSection(i) {{
+  current = JSON.parse(sections[i].textContent);
+  document.querySelectorAll(".tab").forEach((tab, j) => tab.classList.toggle("active", i === j));
+  const select = document.getElementById("figures");
+  select.innerHTML = "";
+  current.figures.forEach((f, j) => select.add(new Option(f.title, j)));
+  show(0);
+}}
+
+sections.forEach((section, i) => {{
+  const tab = document.createElement("button");
+  tab.className = "tab";
+  tab.textContent = section.dataset.name;
+  tab.onclick = () => selectSection(i);
+  document.getElementById("tabs").appendChild(tab);
+}});
+document.getElementById("figures").onchange = e => show(Number(e.target.value));
+if (sections.length) selectSection(0);
+</script>
+</body>
+</html>
+"""
+
+
+def build_dashboard(report_dir, file_name=None, title="Precipitation Report", include_plotlyjs=True):
+    """
+    Writes every stored section of a station report into one HTML page.
+
+    :param report_dir: Directory passed to add_section.
+    :param file_name: Output HTML (defaults to report.html in report_dir).
+    :param title: Page title.
+    :param include_plotlyjs: True embeds plotly.js once, "directory" references a shared
+                             plotly.min.js next to the page and "cdn" loads it from the CDN.
+    :return: Path of the written page.
+    """
+    file_name = file_name or os.path.join(report_dir, "report.html")
+    if include_plotlyjs == "directory":
+        write_plotlyjs(os.path.dirname(os.path.abspath(file_name)))
+        plotlyjs = f'<script src="{PLOTLYJS_FILE}"></script>'
+    elif include_plotlyjs == "cdn":
+        plotlyjs = f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"></script>'
+    else:
+        plotlyjs = f"<script>{get_plotlyjs()}</script>"
+
+    sections = []
+    for section_file in sorted(glob.glob(os.path.join(report_dir, "sections", "*.json"))):
+        with open(section_file, encoding="utf-8") as f:
+            text = f.read()
+        name = json.loads(text)["name"]
+        text = text.replace("</", "<\\/")
+        sections.append(f'<script type="application/json" class="section" data-name="{html.escape(name)}">{text}</script>')
+
+    with open(file_name, "w", encoding="utf-8") as f:
+        f.write(_PAGE.format(title=html.escape(title), plotlyjs=plotlyjs, sections="\n".join(sections),
+                             typed=json.dumps(TYPED_ARRAYS)))
+    return file_name
+
+
+# Store one script's figures and rebuild the combined station page
+def publish_section(report_dir, section, figures, **kwargs):
+    add_section(report_dir, section, figures)
+    return build_dashboard(report_dir, **kwargs)
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+from fitting import ppf
+
+DESIGN_RETURN_PERIODS = (2, 5, 10, 25, 50, 100, 200, 500, 1000)
+
+
+# T-year quantiles for batched parameters: (...) parameters -> (..., len(return_periods))
+def return_period_quantiles(params, distribution, return_periods=DESIGN_RETURN_PERIODS):
+    probabilities = 1 - 1 / np.asarray(return_periods, dtype=float)
+    params = [np.asarray(p, dtype=float)[..., np.newaxis] for p in params]
+
+    # Closed-form quantile functions, so the whole table is one broadcast expression
+    if distribution == "normal":
+        loc, scale = params
+        return loc + scale * norm.ppf(probabilities)
+    elif distribution == "log-normal":
+        shape, loc, scale = params
+        return loc + scale * np.exp(shape * norm.ppf(probabilities))
+    elif distribution == "gumbel":
+        loc, scale = params
+        return loc - scale * np.log(-np.log(probabilities))
+    return ppf(probabilities, [p[..., 0] for p in params], distribution)
+
+
+def design_table(params_by_distribution, return_periods=DESIGN_RETURN_PERIODS, stations=None):
+    """
+    Builds the design rainfall table for every distribution and station.
+
+    :param params_by_distribution: Mapping of distribution name to fitted parameters
+                                   (scalars for one station or arrays over stations).
+    :param return_periods: Return periods T in years.
+    :param stations: Station labels (defaults to 0..n-1).
+    :return: DataFrame indexed by (Station, Distribution) with one column per return period.
+    """
+    frames = []
+    for distribution, params in params_by_distribution.items():
+        values = np.atleast_2d(return_period_quantiles(params, distribution, return_periods))
+        labels = np.arange(len(values)) if stations is None else stations
+        index = pd.MultiIndex.from_product([labels, [distribution]], names=["Station", "Distribution"])
+        frames.append(pd.DataFrame(values, index=index, columns=[f"T={t} years" for t in return_periods]))
+    return pd.concat(frames).sort_index(level="Station", sort_remaining=False)
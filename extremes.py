@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+# Peaks closer than this (last exceedance of one cluster to the first of the next) are one event
+DEFAULT_SEPARATION = "3D"
+
+
+def _prepare(times, values, stations):
+    times = pd.DatetimeIndex(pd.to_datetime(times))
+    values = np.asarray(values, dtype=float)
+    if stations is None:
+        codes, labels = np.zeros(len(values), dtype=int), None
+    else:
+        codes, labels = pd.factorize(pd.Series(stations))
+    valid = ~np.isnan(values) & ~times.isna()
+    return times[valid], values[valid], np.asarray(codes)[valid], labels
+
+
+# Position of the largest value in every run of equal keys; keys and values must be
+# ordered so each group is contiguous with its values ascending
+def _last_of_groups(*keys):
+    changes = np.zeros(len(keys[0]), dtype=bool)
+    for key in keys:
+        changes[:-1] |= key[1:] != key[:-1]
+    changes[-1:] = True
+    return np.flatnonzero(changes)
+
+
+def block_maxima(times, values, stations=None, start_month=1):
+    """
+    Annual maxima of a daily or sub-daily series in one sort, without per-year loops.
+
+    :param times: Timestamps of the observations (any order).
+    :param values: Rainfall amounts; NaN entries are ignored.
+    :param stations: Optional station label of every observation.
+    :param start_month: First month of the block year; 10 gives water years starting in
+                        October, labelled by the year they end in.
+    :return: DataFrame with (Station,) Year, Date of the maximum, Maximum and the number
+             of Observations in the block.
+    """
+    times, values, codes, labels = _prepare(times, values, stations)
+    years = times.year.to_numpy()
+    if start_month > 1:
+        years = years + (times.month.to_numpy() >= start_month)
+
+    order = np.lexsort((values, years, codes))
+    last = _last_of_groups(codes[order], years[order])
+    peaks = order[last]
+
+    frame = pd.DataFrame({
+        "Year": years[peaks],
+        "Date": times[peaks],
+        "Maximum": values[peaks],
+        "Observations": np.diff(np.concatenate([[-1], last])),
+    })
+    if labels is not None:
+        frame.insert(0, "Station", labels[codes[peaks]])
+    return frame
+
+
+def peaks_over_threshold(times, values, threshold, stations=None, separation=DEFAULT_SEPARATION):
+    """
+    Partial-duration series: declustered peaks above a threshold.
+
+    Exceedances are sorted by (station, time) and split into clusters wherever the
+    gap to the previous exceedance is larger than separation; each cluster keeps its
+    largest value, so one storm contributes one peak.
+
+    :param times: Timestamps of the observations (any order).
+    :param values: Rainfall amounts; NaN entries are ignored.
+    :param threshold: Peaks must be strictly above this value.
+    :param stations: Optional station label of every observation.
+    :param separation: Minimum time between independent events (pandas Timedelta string).
+    :return: DataFrame with (Station,) Date, Peak, Start and End of the cluster and the
+             number of Exceedances in it.
+    """
+    times, values, codes, labels = _prepare(times, values, stations)
+    above = values > threshold
+    times, values, codes = times[above], values[above], codes[above]
+
+    stamps = times.to_numpy()
+    order = np.lexsort((stamps.view("i8"), codes))
+    stamps, codes_sorted = stamps[order], codes[order]
+    new_cluster = np.ones(len(order), dtype=bool)
+    gaps = np.diff(stamps) > pd.Timedelta(separation).to_timedelta64()
+    new_cluster[1:] = gaps | (codes_sorted[1:] != codes_sorted[:-1])
+    cluster = np.cumsum(new_cluster) - 1
+
+    # Cluster bounds come from the time order, the peak from a (cluster, value) order
+    starts = np.flatnonzero(new_cluster)
+    ends = np.concatenate([starts[1:], [len(order)]])[:len(starts)] - 1
+    by_value = np.lexsort((values[order], cluster))
+    peaks = order[by_value[_last_of_groups(cluster[by_value])]] if len(order) else order
+
+    frame = pd.DataFrame({
+        "Date": times[peaks],
+        "Peak": values[peaks],
+        "Start": times[order[starts]],
+        "End": times[order[ends]],
+        "Exceedances": ends - starts + 1,
+    })
+    if labels is not None:
+        frame.insert(0, "Station", labels[codes[peaks]])
+    return frame
@@ -0,0 +1,281 @@
+import numpy as np
+from scipy.special import gammaln
+from scipy.stats import gamma, genextreme, gumbel_r, lognorm, norm, pearson3
+from preprocessing import zero_probability
+
+# Distributions used by the scripts unless told otherwise
+DISTRIBUTIONS = ("log-normal", "normal", "gumbel")
+
+# Euler-Mascheroni constant, mean of the standard Gumbel distribution
+EULER_GAMMA = 0.5772156649015329
+
+GUMBEL_ESTIMATORS = ("lmoments", "moments")
+
+
+# First three sample L-moments (l1, l2, t3) along the last axis (NaN entries are ignored)
+def sample_lmoments(values):
+    values = np.sort(np.asarray(values, dtype=float), axis=-1)
+    count = (~np.isnan(values)).sum(axis=-1)
+    rank = np.arange(values.shape[-1])
+    n = count[..., np.newaxis]
+    x = np.nan_to_num(values)
+    b0 = x.sum(axis=-1) / count
+    b1 = (rank / np.maximum(n - 1, 1) * x).sum(axis=-1) / count
+    b2 = (rank * (rank - 1) / np.maximum((n - 1) * (n - 2), 1) * x).sum(axis=-1) / count
+    l2 = 2 * b1 - b0
+    l3 = 6 * b2 - 6 * b1 + b0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return b0, l2, l3 / l2
+
+
+class LogPearson3:
+    """Log-Pearson type III: Pearson III on log10 of the values, with a scipy-like interface."""
+
+    def cdf(self, x, skew, loc, scale):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return pearson3.cdf(np.log10(x), skew, loc, scale)
+
+    def ppf(self, q, skew, loc, scale):
+        return 10 ** pearson3.ppf(q, skew, loc, scale)
+
+    def logpdf(self, x, skew, loc, scale):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return pearson3.logpdf(np.log10(x), skew, loc, scale) - np.log(x * np.log(10))
+
+    def rvs(self, skew, loc, scale, size=None, random_state=None):
+        return 10 ** pearson3.rvs(skew, loc, scale, size=size, random_state=random_state)
+
+    def fit(self, data, *args, **kwds):
+        return pearson3.fit(np.log10(data), *args, **kwds)
+
+
+log_pearson3 = LogPearson3()
+
+
+def _fit_lognormal(values, estimator):
+    logs = np.log(values)
+    return np.nanstd(logs, axis=-1), np.zeros(values.shape[:-1]), np.exp(np.nanmean(logs, axis=-1))
+
+
+def _fit_normal(values, estimator):
+    return np.nanmean(values, axis=-1), np.nanstd(values, axis=-1)
+
+
+def _fit_gumbel(values, estimator):
+    if estimator == "lmoments":
+        l1, l2, _ = sample_lmoments(values)
+        scale = l2 / np.log(2)
+        return l1 - EULER_GAMMA * scale, scale
+    elif estimator == "moments":
+        scale = np.sqrt(6) * np.nanstd(values, axis=-1, ddof=1) / np.pi
+        return np.nanmean(values, axis=-1) - EULER_GAMMA * scale, scale
+    else:
+        raise ValueError("Invalid estimator specified")
+
+
+def _fit_gamma(values, estimator):
+    # Hosking's rational approximation of the shape from the L-CV, loc fixed at 0
+    l1, l2, _ = sample_lmoments(values)
+    t = l2 / l1
+    z_low = np.pi * t ** 2
+    z_high = 1 - t
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shape = np.where(t < 0.5,
+                         (1 - 0.3080 * z_low) / (z_low - 0.05812 * z_low ** 2 + 0.01765 * z_low ** 3),
+                         (0.7213 * z_high - 0.5947 * z_high ** 2) / (1 - 2.1817 * z_high + 1.2113 * z_high ** 2))
+    return shape, np.zeros(np.shape(l1)), l1 / shape
+
+
+def _pearson3_lmoments(l1, l2, t3):
+    # Hosking's rational approximation of the shape alpha from the L-skewness
+    t3 = np.where(np.abs(t3) < 1e-6, 1e-6, t3)
+    z_high = 1 - np.abs(t3)
+    z_low = 3 * np.pi * t3 ** 2
+    alpha = np.where(np.abs(t3) >= 1 / 3,
+                     (0.36067 * z_high - 0.59567 * z_high ** 2 + 0.25361 * z_high ** 3)
+                     / (1 - 2.78861 * z_high + 2.56096 * z_high ** 2 - 0.77045 * z_high ** 3),
+                     (1 + 0.2906 * z_low) / (z_low + 0.1882 * z_low ** 2 + 0.0442 * z_low ** 3))
+    skew = 2 * np.sign(t3) / np.sqrt(alpha)
+    scale = l2 * np.sqrt(np.pi * alpha) * np.exp(gammaln(alpha) - gammaln(alpha + 0.5))
+    return skew, l1, scale
+
+
+def _fit_pearson3(values, estimator):
+    return _pearson3_lmoments(*sample_lmoments(values))
+
+
+def _fit_log_pearson3(values, estimator):
+    return _pearson3_lmoments(*sample_lmoments(np.log10(values)))
+
+
+def _fit_gev(values, estimator):
+    # Hosking's approximation of the shape k (scipy's c) from the L-skewness
+    l1, l2, t3 = sample_lmoments(values)
+    c = 2 / (3 + t3) - np.log(2) / np.log(3)
+    k = 7.8590 * c + 2.9554 * c ** 2
+    k = np.where(np.abs(k) < 1e-8, 1e-8, k)
+    scale = l2 * k / ((1 - 2 ** -k) * np.exp(gammaln(1 + k)))
+    loc = l1 - scale * (1 - np.exp(gammaln(1 + k))) / k
+    return k, loc, scale
+
+
+def _gumbel_mle(values, start):
+    # Newton iterations on the Gumbel maximum likelihood equation for the scale,
+    # vectorized over all leading axes (NaN entries are ignored)
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=-1)
+    x_mean = np.where(valid, values, 0.0).sum(axis=-1) / count
+    x_min = np.nanmin(values, axis=-1)[..., np.newaxis]
+    shifted = np.where(valid, values - x_min, 0.0)
+    scale = np.where(start[1] > 0, start[1], 1.0)
+    for _ in range(50):
+        w = np.where(valid, np.exp(-shifted / scale[..., np.newaxis]), 0.0)
+        w_sum = w.sum(axis=-1)
+        m1 = (w * shifted).sum(axis=-1) / w_sum
+        m2 = (w * shifted ** 2).sum(axis=-1) / w_sum
+        f = scale - (x_mean - x_min[..., 0]) + m1
+        df = 1 + (m2 - m1 ** 2) / scale ** 2
+        step = f / df
+        scale = np.maximum(scale - step, scale / 10)
+        if np.all(np.abs(step) <= 1e-10 * scale):
+            break
+    w = np.where(valid, np.exp(-shifted / scale[..., np.newaxis]), 0.0)
+    loc = x_min[..., 0] - scale * np.log(w.sum(axis=-1) / count)
+    return loc, scale
+
+
+def _scipy_mle(dist, fixed_loc=False):
+    # Per-series scipy MLE started from the L-moment estimate (slow, used only on request)
+    def refine(values, start):
+        params = [np.array(p, dtype=float) for p in np.broadcast_arrays(*start)]
+        for index in np.ndindex(values.shape[:-1]):
+            sample = values[index][~np.isnan(values[index])]
+            guess = [p[index] for p in params]
+            if fixed_loc:
+                fitted = dist.fit(sample, guess[0], floc=0, scale=guess[-1])
+            else:
+                fitted = dist.fit(sample, *guess[:-2], loc=guess[-2], scale=guess[-1])
+            for p, value in zip(params, fitted):
+                p[index] = value
+        return tuple(params)
+    return refine
+
+
+class Distribution:
+    """
+    Registry entry for one candidate distribution.
+
+    dist provides scipy-style cdf/ppf/logpdf/rvs, fitter is a batched estimator along the
+    last axis and refiner (optional) moves that estimate to the maximum likelihood fit.
+    """
+
+    def __init__(self, name, dist, fitter, free_parameters, label, color, refiner=None):
+        self.name = name
+        self.dist = dist
+        self.fitter = fitter
+        self.free_parameters = free_parameters
+        self.label = label
+        self.color = color
+        self.refiner = refiner
+
+    @property
+    def file_suffix(self):
+        return self.name.replace("-", "")
+
+    def fit(self, values, estimator="lmoments", refine=False):
+        values = np.asarray(values, dtype=float)
+        params = self.fitter(values, estimator)
+        if refine and self.refiner is not None:
+            params = self.refiner(values, params)
+        return params
+
+
+REGISTRY = {}
+
+
+def register(distribution):
+    REGISTRY[distribution.name] = distribution
+    return distribution
+
+
+def get_distribution(name):
+    try:
+        return REGISTRY[name]
+    except KeyError:
+        raise ValueError("Invalid method specified") from None
+
+
+register(Distribution("log-normal", lognorm, _fit_lognormal, 2, "Log-Normal", "red"))
+register(Distribution("normal", norm, _fit_normal, 2, "Normal", "green"))
+register(Distribution("gumbel", gumbel_r, _fit_gumbel, 2, "Gumbel", "purple", _gumbel_mle))
+register(Distribution("gamma", gamma, _fit_gamma, 2, "Gamma", "orange", _scipy_mle(gamma, fixed_loc=True)))
+register(Distribution("pearson3", pearson3, _fit_pearson3, 3, "Pearson III", "brown", _scipy_mle(pearson3)))
+register(Distribution("log-pearson3", log_pearson3, _fit_log_pearson3, 3, "Log-Pearson III", "teal",
+                      _scipy_mle(log_pearson3)))
+register(Distribution("gev", genextreme, _fit_gev, 3, "GEV", "black", _scipy_mle(genextreme)))
+
+
+def fit(values, distribution, estimator="lmoments", refine=False):
+    """
+    Fits a distribution along the last axis of values, for every leading index at once.
+
+    Normal and log-normal (floc=0) fits are closed form and equal to the scipy MLE.
+    The other distributions use batched L-moment estimators (Gumbel can also use the
+    method of moments), optionally refined to the maximum likelihood estimate.
+
+    :param values: Array of samples, NaN entries are ignored.
+    :param distribution: Name of a registered distribution.
+    :param estimator: Gumbel estimator, "lmoments" or "moments".
+    :param refine: Refine the fit to the maximum likelihood estimate.
+    :return: Parameters in scipy order, each with the leading shape of values.
+    """
+    return get_distribution(distribution).fit(values, estimator, refine)
+
+
+# Distribution object (scipy or scipy-like) for a registered name
+def scipy_distribution(distribution):
+    return get_distribution(distribution).dist
+
+
+# Evaluate the cdf along the last axis of values with batched parameters from fit
+def cdf(values, params, distribution):
+    params = [np.asarray(p)[..., np.newaxis] for p in params]
+    return scipy_distribution(distribution).cdf(values, *params)
+
+
+# Evaluate the ppf for probabilities along the last axis with batched parameters from fit
+def ppf(probabilities, params, distribution):
+    params = [np.asarray(p)[..., np.newaxis] for p in params]
+    return scipy_distribution(distribution).ppf(probabilities, *params)
+
+
+def fit_mixed(values, distribution, estimator="lmoments", refine=False):
+    """
+    Zero-inflated fit H(x) = q + (1 - q) G(x) along the last axis of values.
+
+    G is fitted on the positive values only and q is the fraction of zeros, both
+    batched over all leading axes like fit.
+
+    :return: (q, params) where params are the parameters of G in scipy order.
+    """
+    values = np.asarray(values, dtype=float)
+    q = zero_probability(values, axis=-1)
+    params = fit(np.where(values > 0, values, np.nan), distribution, estimator, refine)
+    return q, params
+
+
+# H(x) for batched (q, params) from fit_mixed; zeros map to q and NaN stays NaN
+def mixed_cdf(values, q, params, distribution):
+    values = np.asarray(values, dtype=float)
+    q = np.asarray(q)[..., np.newaxis]
+    positive = values > 0
+    g = cdf(np.where(positive, values, np.nan), params, distribution)
+    return np.where(np.isnan(values), np.nan, np.where(positive, q + (1 - q) * g, q))
+
+
+# Inverse of H: probabilities at or below q give 0
+def mixed_ppf(probabilities, q, params, distribution):
+    probabilities = np.asarray(probabilities, dtype=float)
+    q = np.asarray(q)[..., np.newaxis]
+    conditional = np.clip((probabilities - q) / (1 - q), 0, 1)
+    return np.where(probabilities <= q, 0.0, ppf(conditional, params, distribution))
@@ -1,6 +1,8 @@
-import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
+from histogram import histograms
+from loader import load_precipitation
+from preprocessing import clamp_zeros
 
 # Frequency and cumulative frequency validation function
 def validate_frequencies(data, histogram, cumulative_freq, label):
@@ -27,19 +29,9 @@ def validate_frequencies(data, histogram, cumulative_freq, label):
     print("Validation Complete.\n")
     return True
 
-# Function to check for empty bins
-def check_empty_bins(hist, bins, label):
-    empty_bins = np.where(hist == 0)[0]
-    result = {
-        "Label": label,
-        "Empty_Bins_Count": len(empty_bins),
-        "Empty_Bins_Ranges": [(bins[idx], bins[idx + 1]) for idx in empty_bins]
-    }
-    return result
-
 # Loading data
 file_path = r"C:\\Users\\yasar\\work_space\\disrubition-and-frequency\\data\\precipitation_data.csv"
-data = pd.read_csv(file_path)
+data, _ = load_precipitation(file_path)
 
 # Selecting only the monthly precipitation columns (excluding the first column "Year" if it exists)
 monthly_data = data.iloc[:, 1:]
@@ -49,47 +41,34 @@ data['Total_Annual_Rainfall'] = monthly_data.sum(axis=1)
 data['Max_Annual_Rainfall'] = monthly_data.max(axis=1)
 
 # Setting values of 0 to 0.01 for log transformation
-data['Total_Annual_Rainfall'] = data['Total_Annual_Rainfall'].apply(lambda x: x if x > 0 else 0.01)
-data['Max_Annual_Rainfall'] = data['Max_Annual_Rainfall'].apply(lambda x: x if x > 0 else 0.01)
+data['Total_Annual_Rainfall'] = clamp_zeros(data['Total_Annual_Rainfall'])
+data['Max_Annual_Rainfall'] = clamp_zeros(data['Max_Annual_Rainfall'])
 
 # Log transformation
 log_total_rainfall = np.log10(data['Total_Annual_Rainfall'])
 log_max_rainfall = np.log10(data['Max_Annual_Rainfall'])
 
-# Histogram bins (20 bins)
-bins_total_normal = np.linspace(data['Total_Annual_Rainfall'].min(), data['Total_Annual_Rainfall'].max(), 21)
-bins_total_log = np.linspace(log_total_rainfall.min(), log_total_rainfall.max(), 21)
-
-bins_max_normal = np.linspace(data['Max_Annual_Rainfall'].min(), data['Max_Annual_Rainfall'].max(), 21)
-bins_max_log = np.linspace(log_max_rainfall.min(), log_max_rainfall.max(), 21)
-
-# Frequency calculation
-hist_total_normal, bin_edges_total_normal = np.histogram(data['Total_Annual_Rainfall'], bins=bins_total_normal)
-hist_total_log, bin_edges_total_log = np.histogram(log_total_rainfall, bins=bins_total_log)
-
-hist_max_normal, bin_edges_max_normal = np.histogram(data['Max_Annual_Rainfall'], bins=bins_max_normal)
-hist_max_log, bin_edges_max_log = np.histogram(log_max_rainfall, bins=bins_max_log)
-
-# Cumulative frequency calculation
-cumulative_total_normal = np.cumsum(hist_total_normal)
-cumulative_total_log = np.cumsum(hist_total_log)
-
-cumulative_max_normal = np.cumsum(hist_max_normal)
-cumulative_max_log = np.cumsum(hist_max_log)
+# Binning strategy for all histograms: "linspace" (20 equal bins), "sturges", "fd", "quantile" or "log"
+binning = "linspace"
 
-# Checking for empty bins
-empty_bins_total_normal = check_empty_bins(hist_total_normal, bin_edges_total_normal, "Total Annual Rainfall (Normal)")
-empty_bins_total_log = check_empty_bins(hist_total_log, bin_edges_total_log, "Total Annual Rainfall (Log)")
+# Counts, cumulative frequencies and empty-bin diagnostics of all four series in one pass
+frequency_histograms = histograms({
+    "Total Annual Rainfall (Normal)": data['Total_Annual_Rainfall'],
+    "Total Annual Rainfall (Log)": log_total_rainfall,
+    "Max Annual Rainfall (Normal)": data['Max_Annual_Rainfall'],
+    "Max Annual Rainfall (Log)": log_max_rainfall,
+}, strategy=binning)
+total_normal, total_log, max_normal, max_log = frequency_histograms.values()
 
-empty_bins_max_normal = check_empty_bins(hist_max_normal, bin_edges_max_normal, "Max Annual Rainfall (Normal)")
-empty_bins_max_log = check_empty_bins(hist_max_log, bin_edges_max_log, "Max Annual Rainfall (Log)")
+hist_total_normal, bin_edges_total_normal, cumulative_total_normal = total_normal.counts, total_normal.edges, total_normal.cumulative
+hist_total_log, bin_edges_total_log, cumulative_total_log = total_log.counts, total_log.edges, total_log.cumulative
+hist_max_normal, bin_edges_max_normal, cumulative_max_normal = max_normal.counts, max_normal.edges, max_normal.cumulative
+hist_max_log, bin_edges_max_log, cumulative_max_log = max_log.counts, max_log.edges, max_log.cumulative
 
 # Reporting the results of empty bin analysis
 print("\n--- Empty Bins Analysis ---")
-print(empty_bins_total_normal)
-print(empty_bins_total_log)
-print(empty_bins_max_normal)
-print(empty_bins_max_log)
+for histogram in frequency_histograms.values():
+    print(histogram.empty_bins())
 
 # Validations
 valid_total_normal = validate_frequencies(data['Total_Annual_Rainfall'], hist_total_normal, cumulative_total_normal, "Total Annual Rainfall (Normal)")
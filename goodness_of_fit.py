@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+from fitting import DISTRIBUTIONS, fit, get_distribution
+
+CRITERIA = ("KS", "AD", "PPCC", "AIC", "BIC")
+
+# Distributions whose maximum likelihood refinement is batched; the others (gamma,
+# pearson3, log-pearson3, gev) refine one series at a time through scipy
+BATCHED_REFINE = ("gumbel",)
+
+
+def goodness_of_fit(values, distribution, refine=True):
+    """
+    Goodness-of-fit statistics along the last axis of values, for every series at once.
+
+    All statistics come from one sort of each series: Kolmogorov-Smirnov D,
+    Anderson-Darling A², the probability plot correlation coefficient (Weibull
+    plotting positions m/(n+1), as in the scripts) and AIC/BIC.
+
+    :param values: Array of samples (..., n); NaN entries are ignored.
+    :param distribution: Name of a registered distribution.
+    :param refine: Refine the fit to the maximum likelihood estimate.
+    :return: Dictionary of statistic name to array with the leading shape of values.
+    """
+    values = np.sort(np.asarray(values, dtype=float), axis=-1)
+    dist = get_distribution(distribution).dist
+    params = [np.asarray(p)[..., np.newaxis] for p in fit(values, distribution, refine=refine)]
+
+    valid = ~np.isnan(values)
+    n = valid.sum(axis=-1, keepdims=True)
+    i = np.arange(values.shape[-1])
+    cdf = np.clip(dist.cdf(values, *params), 1e-12, 1 - 1e-12)
+
+    # Kolmogorov-Smirnov
+    d_plus = np.where(valid, (i + 1) / n - cdf, -np.inf).max(axis=-1)
+    d_minus = np.where(valid, cdf - i / n, -np.inf).max(axis=-1)
+    ks = np.maximum(d_plus, d_minus)
+
+    # Anderson-Darling, pairing the i-th with the (n - 1 - i)-th order statistic
+    mirrored = np.take_along_axis(cdf, np.clip(n - 1 - i, 0, None), axis=-1)
+    terms = np.where(valid, (2 * i + 1) * (np.log(cdf) + np.log1p(-mirrored)), 0.0)
+    ad = -n[..., 0] - terms.sum(axis=-1) / n[..., 0]
+
+    # Probability plot correlation coefficient
+    quantiles = dist.ppf((i + 1) / (n + 1), *params)
+    x = np.where(valid, values, 0.0)
+    q = np.where(valid, quantiles, 0.0)
+    x_centered = np.where(valid, x - x.sum(axis=-1, keepdims=True) / n, 0.0)
+    q_centered = np.where(valid, q - q.sum(axis=-1, keepdims=True) / n, 0.0)
+    ppcc = (x_centered * q_centered).sum(axis=-1) / np.sqrt(
+        (x_centered ** 2).sum(axis=-1) * (q_centered ** 2).sum(axis=-1))
+
+    # Information criteria
+    log_likelihood = np.where(valid, dist.logpdf(values, *params), 0.0).sum(axis=-1)
+    k = get_distribution(distribution).free_parameters
+    return {
+        "KS": ks,
+        "AD": ad,
+        "PPCC": ppcc,
+        "AIC": 2 * k - 2 * log_likelihood,
+        "BIC": k * np.log(n[..., 0]) - 2 * log_likelihood,
+    }
+
+
+def ranking_table(values, labels=None, distributions=DISTRIBUTIONS, criterion="AIC", refine=BATCHED_REFINE):
+    """
+    Scores every candidate distribution for every series and ranks them.
+
+    :param values: Array of shape (series, n), one row per station/month/window series.
+    :param labels: Series labels (defaults to 0..n-1).
+    :param distributions: Candidate distributions.
+    :param criterion: Statistic used for the ranking (PPCC ranks high to low, the rest low to high).
+    :param refine: True/False for all candidates, or the names of the distributions to
+                   refine to the maximum likelihood estimate. The default refines only the
+                   batched Gumbel fit (normal and log-normal are closed-form MLE already):
+                   10,000 series of 86 values against all seven registered candidates
+                   take about 5 s. refine=True sends gamma, pearson3, log-pearson3 and gev
+                   through a per-series scipy fit, about 70 ms per series.
+    :return: DataFrame with one row per (series, distribution), the statistics, Rank and Best.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    labels = np.arange(len(values)) if labels is None else np.asarray(labels)
+
+    frames = []
+    for distribution in distributions:
+        refined = refine if isinstance(refine, bool) else distribution in refine
+        statistics = goodness_of_fit(values, distribution, refined)
+        frames.append(pd.DataFrame({"Series": labels, "Distribution": distribution, **statistics},
+                                   index=np.arange(len(values))))
+    table = pd.concat(frames).rename_axis("position").reset_index()
+
+    table["Rank"] = table.groupby("position")[criterion].rank(
+        ascending=criterion != "PPCC", method="min").astype(int)
+    table["Best"] = table["Rank"] == 1
+    # Keep the input order of the series, best distribution first within each
+    table = table.sort_values(["position", "Rank"], kind="stable")
+    return table.drop(columns="position").reset_index(drop=True)
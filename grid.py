@@ -0,0 +1,252 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+import pandas as pd
+from design import DESIGN_RETURN_PERIODS, return_period_quantiles
+from fitting import DISTRIBUTIONS, cdf, fit
+from loader import MONTHS
+from spi import compute_spi_k
+
+GRID_VERSION = 1
+
+GRID_INDEX_FILE = "grid.json"
+
+GRID_FILE = "precipitation.npy"
+
+MAPS_INDEX_FILE = "maps.json"
+
+# Dimension names of NetCDF/Zarr cubes, in (time, lat, lon) order
+GRID_DIMS = ("time", "lat", "lon")
+
+# Grid cells (lat, lon) per tile; every tile holds the full time axis
+DEFAULT_TILE = (32, 32)
+
+SPI_SCALES = (1, 3, 6, 12)
+
+
+def _write_json(file_name, content):
+    tmp_file = file_name + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(content, f, indent=2)
+    os.replace(tmp_file, file_name)
+
+
+class GridStore:
+    """
+    Monthly (time, lat, lon) cube as a memory-mapped .npy array with a JSON index.
+
+    The local stand-in for a NetCDF/Zarr cube: read returns one spatial tile over the
+    full time axis and only the pages of that tile are read from disk.
+    """
+
+    def __init__(self, grid_dir):
+        with open(os.path.join(grid_dir, GRID_INDEX_FILE)) as f:
+            index = json.load(f)
+        if index.get("version") != GRID_VERSION:
+            raise ValueError("Unsupported grid version")
+        self.lat = np.asarray(index["lat"])
+        self.lon = np.asarray(index["lon"])
+        self.first_year = index["first_year"]
+        self._values = np.load(os.path.join(grid_dir, GRID_FILE), mmap_mode="r")
+
+    @property
+    def shape(self):
+        return self._values.shape
+
+    def read(self, lat_slice, lon_slice):
+        return np.asarray(self._values[:, lat_slice, lon_slice], dtype=float)
+
+
+class DatasetGrid:
+    """
+    NetCDF or Zarr cube opened lazily with xarray, with the GridStore interface.
+
+    xarray (with netCDF4 or zarr) is only needed for these files; the series must be
+    monthly and start in January.
+    """
+
+    def __init__(self, path, variable="precipitation", dims=GRID_DIMS):
+        import xarray
+        dataset = xarray.open_zarr(path) if path.rstrip("/\\").endswith(".zarr") else xarray.open_dataset(path)
+        self._array = dataset[variable].transpose(*dims)
+        times = pd.DatetimeIndex(self._array[dims[0]].values)
+        if times[0].month != 1:
+            raise ValueError("Gridded series must start in January")
+        self.lat = self._array[dims[1]].values
+        self.lon = self._array[dims[2]].values
+        self.first_year = int(times[0].year)
+
+    @property
+    def shape(self):
+        return self._array.shape
+
+    def read(self, lat_slice, lon_slice):
+        return np.asarray(self._array[:, lat_slice, lon_slice].values, dtype=float)
+
+
+# GridStore directory, or a NetCDF/Zarr file read through xarray
+def open_grid(path, variable="precipitation", dims=GRID_DIMS):
+    if os.path.exists(os.path.join(path, GRID_INDEX_FILE)):
+        return GridStore(path)
+    return DatasetGrid(path, variable, dims)
+
+
+def write_synthetic_grid(grid_dir, years=60, lat=None, lon=None, first_year=1960, seed=12345):
+    """
+    Writes a synthetic monthly cube in the GridStore layout, to emulate gridded input.
+
+    Totals are gamma distributed with a seasonal cycle and a wetter north; cells on
+    the (NaN) sea mask have no data. The cube is written one year at a time.
+
+    :param lat: Latitudes of the grid (defaults to 36..42 in 0.25 degree steps).
+    :param lon: Longitudes of the grid (defaults to 26..45 in 0.25 degree steps).
+    :return: Path of the grid directory.
+    """
+    lat = np.arange(36, 42.001, 0.25) if lat is None else np.asarray(lat, dtype=float)
+    lon = np.arange(26, 45.001, 0.25) if lon is None else np.asarray(lon, dtype=float)
+    os.makedirs(grid_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    seasonal = 1 + 0.8 * np.cos(2 * np.pi * np.arange(len(MONTHS)) / len(MONTHS))
+    wetness = 20 + 40 * (lat - lat.min())[:, np.newaxis] / max(np.ptp(lat), 1) + np.zeros(len(lon))
+    sea = (lat[:, np.newaxis] < lat.min() + 0.1 * np.ptp(lat)) & (lon < lon.min() + 0.3 * np.ptp(lon))
+
+    values = np.lib.format.open_memmap(os.path.join(grid_dir, GRID_FILE), mode="w+", dtype=float,
+                                       shape=(years * len(MONTHS), len(lat), len(lon)))
+    for year in range(years):
+        scale = seasonal[:, np.newaxis, np.newaxis] * wetness / 2
+        totals = rng.gamma(2.0, scale)
+        totals[rng.random(totals.shape) < 0.05] = 0.0
+        totals[:, sea] = np.nan
+        values[year * len(MONTHS):(year + 1) * len(MONTHS)] = totals
+    values.flush()
+    del values
+
+    _write_json(os.path.join(grid_dir, GRID_INDEX_FILE), {
+        "version": GRID_VERSION,
+        "first_year": int(first_year),
+        "lat": lat.tolist(),
+        "lon": lon.tolist(),
+    })
+    return grid_dir
+
+
+# (lat, lon) slices covering the grid in tiles of tile cells
+def grid_tiles(shape, tile=DEFAULT_TILE):
+    return [(slice(i, min(i + tile[0], shape[1])), slice(j, min(j + tile[1], shape[2])))
+            for i in range(0, shape[1], tile[0]) for j in range(0, shape[2], tile[1])]
+
+
+# (time, ny, nx) cube -> (cells, years, 12) monthly totals, padding the last year with NaN
+def _cell_series(cube):
+    n_years = -(-cube.shape[0] // len(MONTHS))
+    padded = np.full((n_years * len(MONTHS),) + cube.shape[1:], np.nan)
+    padded[:cube.shape[0]] = cube
+    return np.moveaxis(padded.reshape(n_years, len(MONTHS), -1), -1, 0)
+
+
+# (cells, ...) results of the valid cells -> (..., ny, nx) tile with NaN elsewhere
+def _to_tile(values, valid, tile_shape):
+    tile = np.full(values.shape[1:] + (valid.size,), np.nan)
+    tile[..., valid] = np.moveaxis(values, 0, -1)
+    return tile.reshape(values.shape[1:] + tile_shape)
+
+
+def _write_tile(output_dir, name, lat_slice, lon_slice, tile):
+    values = np.load(os.path.join(output_dir, f"{name}.npy"), mmap_mode="r+")
+    values[..., lat_slice, lon_slice] = tile
+    values.flush()
+
+
+def _tile_job(tile, grid_path, output_dir, methods, scales, return_periods, refine, variable, dims):
+    lat_slice, lon_slice = tile
+    cube = open_grid(grid_path, variable, dims).read(lat_slice, lon_slice)
+    n_time, tile_shape = cube.shape[0], cube.shape[1:]
+
+    # Cells without data are skipped; compute_spi_k clamps zero months itself
+    precipitation = _cell_series(cube)
+    valid = ~np.all(np.isnan(precipitation), axis=(1, 2))
+    if not valid.any():
+        return
+    precipitation = precipitation[valid]
+
+    # SPI-k per calendar month: (methods, cells, scales, years, 12) -> (scales, time) per cell
+    spi = compute_spi_k(precipitation, scales, methods=methods, refine=refine).values
+    spi = spi.reshape(spi.shape[:3] + (-1,))[..., :n_time]
+
+    # Annual totals and the 1.5 Qmax threshold, as in distrubition.py
+    annual = precipitation.sum(axis=-1)
+    qmax_1_5 = 1.5 * np.nanmax(precipitation, axis=(1, 2))
+    for k, method in enumerate(methods):
+        params = fit(annual, method, refine=refine)
+        quantiles = return_period_quantiles(params, method, return_periods)
+        qmax_period = 1 / (1 - cdf(qmax_1_5[:, np.newaxis], params, method)[:, 0])
+        _write_tile(output_dir, f"spi_{method}", lat_slice, lon_slice, _to_tile(spi[k], valid, tile_shape))
+        _write_tile(output_dir, f"return_period_quantiles_{method}", lat_slice, lon_slice,
+                    _to_tile(quantiles, valid, tile_shape))
+        _write_tile(output_dir, f"qmax_return_period_{method}", lat_slice, lon_slice,
+                    _to_tile(qmax_period, valid, tile_shape))
+
+
+def run_grid(grid_path, output_dir, methods=DISTRIBUTIONS, scales=SPI_SCALES,
+             return_periods=DESIGN_RETURN_PERIODS, tile=DEFAULT_TILE, workers=None, refine=True,
+             variable="precipitation", dims=GRID_DIMS):
+    """
+    Per-cell SPI, distribution fits and return-period analysis of a gridded cube.
+
+    The grid is split into spatial tiles that each hold the full time axis; every
+    tile is read, fitted in batched calls (one fit per method for all its cells) and
+    written into memory-mapped output maps by a process pool, so neither the input
+    nor the outputs are ever held in memory as a whole.
+
+    :param grid_path: GridStore directory or NetCDF/Zarr cube (see open_grid).
+    :param output_dir: Output directory for the .npy maps and their JSON index.
+    :param methods: Distributions to fit.
+    :param scales: SPI accumulation periods in months.
+    :param return_periods: Return periods T in years of the annual-total quantile maps.
+    :param tile: (lat, lon) cells per tile.
+    :param workers: Number of worker processes (None uses all cores, 1 runs serially).
+    :param refine: Refine the fast Gumbel fit to the maximum likelihood estimate.
+    :return: Output index with the coordinates and the path of every map.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    grid = open_grid(grid_path, variable, dims)
+    n_time, n_lat, n_lon = grid.shape
+
+    shapes = {}
+    for method in methods:
+        shapes[f"spi_{method}"] = (len(scales), n_time, n_lat, n_lon)
+        shapes[f"return_period_quantiles_{method}"] = (len(return_periods), n_lat, n_lon)
+        shapes[f"qmax_return_period_{method}"] = (n_lat, n_lon)
+    for name, shape in shapes.items():
+        values = np.lib.format.open_memmap(os.path.join(output_dir, f"{name}.npy"), mode="w+",
+                                           dtype=float, shape=shape)
+        values[:] = np.nan
+        values.flush()
+        del values
+
+    jobs = grid_tiles(grid.shape, tile)
+    job = partial(_tile_job, grid_path=grid_path, output_dir=output_dir, methods=list(methods),
+                  scales=list(scales), return_periods=list(return_periods), refine=refine,
+                  variable=variable, dims=dims)
+    if workers == 1 or len(jobs) <= 1:
+        for tile_slices in jobs:
+            job(tile_slices)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(job, jobs))
+
+    index = {
+        "version": GRID_VERSION,
+        "first_year": int(grid.first_year),
+        "lat": np.asarray(grid.lat).tolist(),
+        "lon": np.asarray(grid.lon).tolist(),
+        "methods": list(methods),
+        "scales": list(scales),
+        "return_periods": list(return_periods),
+        "maps": {name: os.path.join(output_dir, f"{name}.npy") for name in shapes},
+    }
+    _write_json(os.path.join(output_dir, MAPS_INDEX_FILE), index)
+    return index
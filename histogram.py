@@ -0,0 +1,117 @@
+import numpy as np
+
+BINNINGS = ("linspace", "sturges", "fd", "quantile", "log")
+
+DEFAULT_BINS = 20
+
+
+def bin_edges(values, strategy="linspace", bins=DEFAULT_BINS):
+    """
+    Bin edges of one series for the given strategy.
+
+    "linspace" uses bins equal-width bins (the original frequency.py binning),
+    "sturges" ceil(log2 n) + 1 equal-width bins, "fd" the Freedman-Diaconis width
+    2 IQR n^(-1/3), "quantile" bins holding equal counts and "log" bins equal in
+    log space over the positive values.
+
+    :param values: Array of samples; NaN entries are ignored.
+    :param strategy: One of BINNINGS.
+    :param bins: Number of bins for "linspace", "quantile" and "log".
+    :return: Increasing array of bin edges.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    low, high = values.min(), values.max()
+    if strategy == "linspace":
+        return np.linspace(low, high, bins + 1)
+    elif strategy == "sturges":
+        return np.linspace(low, high, int(np.ceil(np.log2(len(values)))) + 2)
+    elif strategy == "fd":
+        q1, q3 = np.percentile(values, [25, 75])
+        width = 2 * (q3 - q1) / len(values) ** (1 / 3)
+        if width <= 0:
+            return bin_edges(values, "sturges")
+        return np.linspace(low, high, max(1, int(np.ceil((high - low) / width))) + 1)
+    elif strategy == "quantile":
+        return np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)))
+    elif strategy == "log":
+        return np.geomspace(values[values > 0].min(), high, bins + 1)
+    else:
+        raise ValueError("Invalid binning strategy specified")
+
+
+class Histogram:
+    """
+    Counts on fixed edges with the derived frequencies and diagnostics.
+
+    Bins are [a, b) except the last, which is [a, b] (np.histogram semantics); values
+    outside the edges are kept as underflow/overflow counts. Histograms on the same
+    edges merge exactly, so chunks or workers can each count part of an archive.
+    """
+
+    def __init__(self, edges, label=None):
+        self.edges = np.asarray(edges, dtype=float)
+        self.label = label
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+        self.missing = 0
+
+    @classmethod
+    def from_values(cls, values, strategy="linspace", bins=DEFAULT_BINS, label=None):
+        return cls(bin_edges(values, strategy, bins), label).add(values)
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        missing = np.isnan(values)
+        self.missing += int(missing.sum())
+        values = values[~missing]
+        index = np.searchsorted(self.edges, values, side="right") - 1
+        index[values == self.edges[-1]] = len(self.counts) - 1
+        self.underflow += int((index < 0).sum())
+        self.overflow += int((index >= len(self.counts)).sum())
+        inside = (index >= 0) & (index < len(self.counts))
+        self.counts += np.bincount(index[inside], minlength=len(self.counts))
+        return self
+
+    def merge(self, other):
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Histograms with different bin edges cannot be merged")
+        merged = Histogram(self.edges, self.label)
+        merged.counts = self.counts + other.counts
+        merged.underflow = self.underflow + other.underflow
+        merged.overflow = self.overflow + other.overflow
+        merged.missing = self.missing + other.missing
+        return merged
+
+    __add__ = merge
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    @property
+    def cumulative(self):
+        return np.cumsum(self.counts)
+
+    @property
+    def frequencies(self):
+        return self.counts / max(self.total, 1)
+
+    @property
+    def normalized_cumulative(self):
+        return self.cumulative / max(self.total, 1)
+
+    # Empty-bin report (label, count and ranges) printed by frequency.py
+    def empty_bins(self):
+        empty = np.flatnonzero(self.counts == 0)
+        return {
+            "Label": self.label,
+            "Empty_Bins_Count": len(empty),
+            "Empty_Bins_Ranges": [(self.edges[i], self.edges[i + 1]) for i in empty],
+        }
+
+
+# Histograms of many series with one strategy; Histogram.merge combines partial results
+def histograms(series, strategy="linspace", bins=DEFAULT_BINS):
+    return {label: Histogram.from_values(values, strategy, bins, label) for label, values in series.items()}
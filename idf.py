@@ -0,0 +1,195 @@
+import argparse
+import os
+import warnings
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from design import return_period_quantiles
+from fitting import cdf, fit, get_distribution
+from rendering import render_figures
+
+# Storm durations in minutes, 5 min to 72 h
+IDF_DURATIONS = (5, 10, 15, 30, 60, 120, 180, 360, 720, 1440, 2880, 4320)
+
+IDF_RETURN_PERIODS = (2, 5, 10, 25, 50, 100)
+
+
+def duration_label(minutes):
+    return f"{minutes // 60} h" if minutes >= 60 and minutes % 60 == 0 else f"{minutes} min"
+
+
+def annual_duration_maxima(times, values, durations=IDF_DURATIONS):
+    """
+    Annual maximum rainfall depth for every duration from one cumulative sum.
+
+    The record is placed on a regular grid at its smallest time step; the depth of
+    every window is a difference of the cumulative sum, and windows containing a
+    missing step are NaN. Windows belong to the year of their last step.
+
+    :param times: Timestamps of a regular (gaps allowed) sub-daily or daily record.
+    :param values: Rainfall depth per time step; NaN entries are missing.
+    :param durations: Durations in minutes, multiples of the time step; durations
+                      shorter than the step (e.g. 5 min on a daily record) are skipped
+                      with a warning.
+    :return: (maxima, years, durations) with maxima of shape (durations, years) for
+             the durations that were kept.
+    """
+    times = pd.DatetimeIndex(pd.to_datetime(times))
+    order = np.argsort(times.to_numpy(), kind="stable")
+    stamps = times.to_numpy()[order]
+    values = np.asarray(values, dtype=float)[order]
+    if len(stamps) < 2:
+        raise ValueError("At least two time steps are needed")
+    step = np.diff(stamps).min()
+    if step <= np.timedelta64(0):
+        raise ValueError("Duplicate timestamps in the record")
+
+    durations = np.asarray(durations)
+    windows = np.array([pd.Timedelta(minutes=int(d)).to_timedelta64() / step for d in durations])
+    too_short = windows < 1
+    if too_short.any():
+        warnings.warn(f"Skipping durations shorter than the {pd.Timedelta(step)} time step: "
+                      f"{', '.join(duration_label(int(d)) for d in durations[too_short])}")
+        durations, windows = durations[~too_short], windows[~too_short]
+    if len(durations) == 0:
+        raise ValueError("No duration is as long as the time step")
+    if np.any(windows != np.round(windows)):
+        raise ValueError("Durations must be multiples of the time step")
+    windows = windows.astype(int)
+
+    grid = np.full(int((stamps[-1] - stamps[0]) // step) + 1, np.nan)
+    grid[((stamps - stamps[0]) // step).astype(int)] = values
+    missing = np.isnan(grid)
+    cumulative = np.concatenate([[0.0], np.cumsum(np.where(missing, 0.0, grid))])
+    cumulative_missing = np.concatenate([[0], np.cumsum(missing)])
+
+    years = pd.DatetimeIndex(stamps[0] + np.arange(len(grid)) * step).year.to_numpy()
+    starts = np.flatnonzero(np.concatenate([[True], years[1:] != years[:-1]]))
+
+    maxima = np.full((len(windows), len(starts)), np.nan)
+    for i, k in enumerate(windows):
+        if k > len(grid):
+            continue
+        depths = np.full(len(grid), np.nan)
+        depths[k - 1:] = np.where(cumulative_missing[k:] - cumulative_missing[:-k] == 0,
+                                  cumulative[k:] - cumulative[:-k], np.nan)
+        maxima[i] = np.fmax.reduceat(depths, starts)
+    return maxima, years[starts], durations.tolist()
+
+
+# Intensity (mm/h) per duration and return period from fitted per-duration parameters
+def intensity_table(params, distribution, durations=IDF_DURATIONS, return_periods=IDF_RETURN_PERIODS):
+    depths = return_period_quantiles(params, distribution, return_periods)
+    intensities = depths / (np.asarray(durations, dtype=float)[:, np.newaxis] / 60)
+    return pd.DataFrame(intensities, index=pd.Index(durations, name="Duration (min)"),
+                        columns=[f"T={t} years" for t in return_periods])
+
+
+def build_idf_figure(table, method_name):
+    fig = go.Figure()
+
+    # One intensity curve per return period
+    for column in table.columns:
+        fig.add_trace(go.Scatter(
+            x=table.index,
+            y=table[column],
+            mode='lines+markers',
+            name=column,
+            text=[f'Duration: {duration_label(d)}, Intensity: {i:.2f} mm/h' for d, i in zip(table.index, table[column])],
+            hoverinfo='text'
+        ))
+
+    fig.update_layout(
+        title=f"{method_name} Intensity-Duration-Frequency Curves",
+        xaxis_title="Duration (min)",
+        yaxis_title="Intensity (mm/h)",
+        template="plotly_white",
+        xaxis=dict(type='log'),
+        yaxis=dict(type='log')
+    )
+    return fig
+
+
+# Annual maxima of one duration against the fitted curve, styled like plot_distribution
+def build_duration_figure(duration, sorted_data, probabilities, x_fit, cdf_fit, method_name, color):
+    fig = go.Figure()
+
+    fig.add_trace(go.Scatter(
+        x=probabilities,
+        y=sorted_data,
+        mode='markers',
+        name='Annual Maxima',
+        marker=dict(color='blue'),
+        text=[f'Probability: {prob:.2f}%, Depth: {val:.2f} mm' for prob, val in zip(probabilities, sorted_data)],
+        hoverinfo='text'
+    ))
+
+    fig.add_trace(go.Scatter(
+        x=cdf_fit * 100,
+        y=x_fit,
+        mode='lines',
+        name=f'{method_name} Fit',
+        line=dict(color=color)
+    ))
+
+    fig.update_layout(
+        title=f"{method_name} Distribution for {duration_label(duration)} Annual Maxima",
+        xaxis_title="Probability (%)",
+        yaxis_title="Rainfall Depth (mm)",
+        template="plotly_white",
+        xaxis=dict(type='log'),
+        yaxis=dict(type='log')
+    )
+    return fig
+
+
+def run_idf(file_path, output_dir, distribution="gumbel", durations=IDF_DURATIONS,
+            return_periods=IDF_RETURN_PERIODS, workers=None, shared_plotlyjs=False):
+    """
+    IDF analysis of one gauge file with Date and Precipitation columns.
+
+    All durations are fitted in one batched call. Writes the annual maxima and the
+    intensity table as CSV, the IDF curves and one probability plot per duration.
+
+    :return: Intensity table (mm/h) indexed by duration in minutes.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    records = pd.read_csv(file_path, usecols=["Date", "Precipitation"])
+    maxima, years, durations = annual_duration_maxima(records["Date"], records["Precipitation"], durations)
+
+    registered = get_distribution(distribution)
+    params = fit(maxima, distribution, refine=True)
+    table = intensity_table(params, distribution, durations, return_periods)
+
+    suffix = registered.file_suffix
+    pd.DataFrame(maxima.T, index=pd.Index(years, name="Year"),
+                 columns=[duration_label(d) for d in durations]).to_csv(os.path.join(output_dir, "IDF_Annual_Maxima.csv"))
+    table.to_csv(os.path.join(output_dir, f"IDF_Table_{suffix}.csv"))
+
+    jobs = [(build_idf_figure, (table, registered.label), os.path.join(output_dir, f"IDF_Curves_{suffix}.html"))]
+    for i, duration in enumerate(durations):
+        sorted_data = np.sort(maxima[i][~np.isnan(maxima[i])])
+        if len(sorted_data) == 0:
+            continue
+        probabilities = 100 * (np.arange(1, len(sorted_data) + 1) / (len(sorted_data) + 1))
+        x_fit = np.linspace(sorted_data.min(), sorted_data.max(), 100)
+        cdf_fit = cdf(x_fit, [p[i] for p in params], distribution)
+        file_name = os.path.join(output_dir, f"{registered.label}_Probability_{suffix}_{duration}min.html")
+        jobs.append((build_duration_figure, (duration, sorted_data, probabilities, x_fit, cdf_fit,
+                                             registered.label, registered.color), file_name))
+    render_figures(jobs, workers=workers, shared_plotlyjs=shared_plotlyjs)
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Intensity-duration-frequency curves for one gauge file")
+    parser.add_argument("file_path")
+    parser.add_argument("--out", default="idf")
+    parser.add_argument("--distribution", default="gumbel")
+    parser.add_argument("--durations", nargs="+", type=int, default=list(IDF_DURATIONS))
+    parser.add_argument("--return-periods", nargs="+", type=int, default=list(IDF_RETURN_PERIODS))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--shared-plotlyjs", action="store_true")
+    args = parser.parse_args()
+    print(run_idf(args.file_path, args.out, args.distribution, args.durations, args.return_periods,
+                  args.workers, args.shared_plotlyjs))
@@ -0,0 +1,150 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+from fitting import DISTRIBUTIONS, fit, scipy_distribution
+from loader import MONTHS, load_precipitation
+from preprocessing import clamp_zeros
+from spi import running_sums, running_totals, station_array
+
+
+# Index just past the last observed month of the continuous series
+def observed_months(precipitation):
+    series = np.asarray(precipitation, dtype=float).reshape(precipitation.shape[0], -1)
+    observed = np.flatnonzero(~np.all(np.isnan(series), axis=0))
+    return int(observed[-1]) + 1 if len(observed) else 0
+
+
+def calibrate(precipitation, years, scales=(1, 3, 6, 12), methods=DISTRIBUTIONS,
+              reference_years=None, refine=True):
+    """
+    Fits SPI-k parameters per (station, scale, calendar month) over a reference period.
+
+    :param precipitation: Array of shape (stations, years, 12) with monthly totals; zero
+                          months are clamped to the 0.01 floor, missing (NaN) months stay
+                          missing.
+    :param years: Year labels of the precipitation array.
+    :param scales: Accumulation periods in months.
+    :param methods: Distributions to fit.
+    :param reference_years: (first, last) years of the reference period (defaults to all years).
+    :param refine: Refine the fast Gumbel fit to the maximum likelihood estimate.
+    :return: State dictionary for update_spi and save_state.
+    """
+    precipitation = np.asarray(precipitation, dtype=float)
+    precipitation = np.where(np.isnan(precipitation), np.nan, clamp_zeros(precipitation))
+    years = np.asarray(years)
+    if reference_years is None:
+        reference_years = (years.min(), years.max())
+    in_reference = (years >= reference_years[0]) & (years <= reference_years[1])
+
+    # Running sums use the full series so reference windows can reach back before it
+    totals = np.swapaxes(running_totals(precipitation, scales)[..., in_reference, :], -1, -2)
+    state = {
+        "scales": np.asarray(scales),
+        "methods": np.asarray(methods),
+        "first_year": int(years[0]),
+        "reference_years": np.asarray(reference_years),
+        "observed": observed_months(precipitation),
+    }
+    for method in methods:
+        state[f"params/{method}"] = np.stack(fit(totals, method, refine=refine), axis=-1)
+    return state
+
+
+def update_spi(state, precipitation):
+    """
+    Computes SPI for the months observed since the state was last updated.
+
+    Only the new months and the k - 1 months before them are summed, and their
+    SPI is taken from the frozen reference fit.
+
+    :param state: State dictionary from calibrate or load_state (updated in place).
+    :param precipitation: Array of shape (stations, years, 12) including the new months,
+                          clamped like calibrate.
+    :return: DataFrame with station, scale, year, month and one SPI column per method,
+             empty if there are no new months.
+    """
+    precipitation = np.asarray(precipitation, dtype=float)
+    precipitation = np.where(np.isnan(precipitation), np.nan, clamp_zeros(precipitation))
+    observed = observed_months(precipitation)
+    start = state["observed"]
+    if observed <= start:
+        return pd.DataFrame(columns=["station", "scale", "year", "month"] + list(state["methods"]))
+
+    scales = state["scales"]
+    series = np.asarray(precipitation, dtype=float).reshape(precipitation.shape[0], -1)
+    tail_start = max(0, start - int(scales.max()) + 1)
+    totals = running_sums(series[:, tail_start:observed], scales)[..., start - tail_start:]
+
+    positions = np.arange(start, observed)
+    calendar_months = positions % 12
+    columns = {}
+    for method in state["methods"]:
+        params = state[f"params/{method}"][:, :, calendar_months, :]
+        cdf = scipy_distribution(method).cdf(totals, *np.moveaxis(params, -1, 0))
+        columns[method] = norm.ppf(np.clip(cdf, 1e-6, 1 - 1e-6)).ravel()
+
+    n_stations, n_scales, n_new = totals.shape
+    frame = pd.DataFrame({
+        "station": np.repeat(np.arange(n_stations), n_scales * n_new),
+        "scale": np.tile(np.repeat(scales, n_new), n_stations),
+        "year": np.tile(state["first_year"] + positions // 12, n_stations * n_scales),
+        "month": np.tile(np.asarray(MONTHS)[calendar_months], n_stations * n_scales),
+        **columns,
+    })
+    state["observed"] = observed
+    return frame
+
+
+def save_state(state, state_file):
+    tmp_file = state_file + ".tmp.npz"
+    np.savez(tmp_file, **state)
+    os.replace(tmp_file, state_file)
+
+
+def load_state(state_file):
+    with np.load(state_file, allow_pickle=False) as stored:
+        state = {key: stored[key] for key in stored.files}
+    state["first_year"] = int(state["first_year"])
+    state["observed"] = int(state["observed"])
+    return state
+
+
+def run_incremental(file_path, state_file, csv_file, recalibrate=False, reference_years=None):
+    """
+    Updates the rolling SPI table of one station file with only the newly observed months.
+
+    The first run (or recalibrate=True) fits the reference period and writes the whole
+    table; later runs append the new rows to csv_file and leave everything else untouched.
+    """
+    data, _ = load_precipitation(file_path)
+    precipitation, years = station_array(data)
+
+    if recalibrate or not os.path.exists(state_file):
+        state = calibrate(precipitation, years, reference_years=reference_years)
+        state["observed"] = 0
+        rows = update_spi(state, precipitation).dropna()
+        rows.drop(columns="station").to_csv(csv_file, index=False)
+    else:
+        state = load_state(state_file)
+        rows = update_spi(state, precipitation)
+        if len(rows) == 0:
+            print("No new observations.")
+            return rows
+        rows.drop(columns="station").to_csv(csv_file, mode="a", header=False, index=False)
+
+    save_state(state, state_file)
+    print(f"Saved {len(rows)} SPI rows to: {csv_file}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental SPI-k update for one station file")
+    parser.add_argument("file_path")
+    parser.add_argument("--state", default="spi_state.npz")
+    parser.add_argument("--csv", default="SPI-k_Incremental.csv")
+    parser.add_argument("--recalibrate", action="store_true")
+    parser.add_argument("--reference", nargs=2, type=int, metavar=("FIRST", "LAST"))
+    args = parser.parse_args()
+    run_incremental(args.file_path, args.state, args.csv, args.recalibrate, args.reference)
@@ -0,0 +1,128 @@
+import os
+import numpy as np
+import pandas as pd
+from loader import MONTHS
+
+DEFAULT_CHUNKSIZE = 1_000_000
+
+
+# Stage 1: raw chunks of the daily feed (CSV or whitespace separated text with sep=r"\s+")
+def read_chunks(file_path, chunksize=DEFAULT_CHUNKSIZE, sep=",", na_values=None):
+    yield from pd.read_csv(file_path, sep=sep, chunksize=chunksize, na_values=na_values)
+
+
+# Stage 2: Station, Year, Month (1..12), Precipitation for every daily record
+def normalize_chunks(chunks, station=None, station_column="Station", date_column="Date",
+                     value_column="Precipitation", date_format=None):
+    for chunk in chunks:
+        dates = pd.to_datetime(chunk[date_column], format=date_format)
+        values = pd.to_numeric(chunk[value_column], errors="coerce").to_numpy(dtype=float)
+        yield pd.DataFrame({
+            "Station": chunk[station_column].astype(str).to_numpy() if station is None else station,
+            "Year": dates.dt.year.to_numpy(),
+            "Month": dates.dt.month.to_numpy(),
+            # Negative values are missing-data flags in most gauge feeds
+            "Precipitation": np.where(values >= 0, values, np.nan),
+        })
+
+
+class DailyAggregator:
+    """
+    Running monthly totals, monthly maximum daily rainfall and valid-day counts.
+
+    Memory is one row per (station, year, month), whatever the length of the feed.
+    """
+
+    def __init__(self):
+        self._monthly = None
+
+    def update(self, chunk):
+        grouped = chunk.groupby(["Station", "Year", "Month"])["Precipitation"].agg(
+            Total="sum", Maximum="max", Days="count")
+        if self._monthly is None:
+            self._monthly = grouped
+        else:
+            self._monthly = pd.concat([self._monthly, grouped]).groupby(level=[0, 1, 2]).agg(
+                {"Total": "sum", "Maximum": "max", "Days": "sum"})
+        return self
+
+    @property
+    def stations(self):
+        return list(self._monthly.index.unique(level="Station"))
+
+    def monthly(self, min_days=1):
+        """
+        Long monthly table with Station, Year, Month, Total, Maximum and Days.
+
+        :param min_days: Months with fewer valid days get NaN totals and maxima.
+        """
+        monthly = self._monthly.reset_index()
+        incomplete = monthly["Days"] < min_days
+        monthly.loc[incomplete, ["Total", "Maximum"]] = np.nan
+        return monthly
+
+    def monthly_table(self, station, min_days=1):
+        """
+        Wide Year x January..December totals of one station, the precipitation_data.csv layout.
+
+        :param station: Station label.
+        :param min_days: Months with fewer valid days are left empty.
+        :return: DataFrame with a Year column and one column per month.
+        """
+        monthly = self.monthly(min_days)
+        monthly = monthly[monthly["Station"] == str(station)]
+        table = monthly.pivot(index="Year", columns="Month", values="Total")
+        table = table.reindex(index=range(table.index.min(), table.index.max() + 1), columns=range(1, 13))
+        table.columns = MONTHS
+        return table.rename_axis(None, axis=1).rename_axis("Year").reset_index()
+
+    # Annual maximum daily rainfall per station and year, from the monthly maxima
+    def annual_maxima(self, min_days=1):
+        maxima = self.monthly(min_days).groupby(["Station", "Year"])["Maximum"].max()
+        return maxima.rename("Max Daily Rainfall (mm)").reset_index()
+
+
+def ingest_daily(file_path, chunksize=DEFAULT_CHUNKSIZE, sep=",", station=None, station_column="Station",
+                 date_column="Date", value_column="Precipitation", date_format=None, na_values=None):
+    """
+    Streams a daily gauge feed through read -> normalize -> aggregate in chunks.
+
+    Only one chunk and the monthly aggregates are in memory at a time, so the
+    feed can be larger than RAM.
+
+    :param file_path: Daily CSV or text file.
+    :param chunksize: Rows read per chunk.
+    :param sep: Field separator (r"\\s+" for whitespace separated text).
+    :param station: Station label for single-gauge files without a station column.
+    :param date_format: strftime format of the date column (inferred when None).
+    :param na_values: Extra strings treated as missing, e.g. ["-999", "T"].
+    :return: DailyAggregator with the monthly totals and maxima.
+    """
+    if station is None and station_column is None:
+        station = os.path.splitext(os.path.basename(file_path))[0]
+    chunks = read_chunks(file_path, chunksize, sep, na_values)
+    records = normalize_chunks(chunks, station, station_column, date_column, value_column, date_format)
+    aggregator = DailyAggregator()
+    for chunk in records:
+        aggregator.update(chunk)
+    return aggregator
+
+
+def write_station_files(aggregator, output_dir, min_days=1):
+    """
+    Writes one wide monthly CSV per station plus annual_maxima.csv.
+
+    The station files have the precipitation_data.csv layout, so they can be used as
+    file_path in the scripts (frequency.py, total-and-max-rainfall.py, the SPI
+    scripts) or passed to store.convert_station_files.
+
+    :return: Mapping of station label to written file.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    files = {}
+    for station in aggregator.stations:
+        file_name = os.path.join(output_dir, f"{station}.csv")
+        aggregator.monthly_table(station, min_days).to_csv(file_name, index=False)
+        files[station] = file_name
+    aggregator.annual_maxima(min_days).to_csv(os.path.join(output_dir, "annual_maxima.csv"), index=False)
+    return files
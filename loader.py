@@ -0,0 +1,142 @@
+import glob
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+from preprocessing import DEFAULT_FLOOR, prepare_precipitation
+
+MONTHS = ["January", "February", "March", "April", "May", "June",
+          "July", "August", "September", "October", "November", "December"]
+
+# Bump this when the cached layout changes so old cache files are ignored
+CACHE_VERSION = 2
+
+
+# Hash of the raw station file, used as the cache key
+def file_hash(file_path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def default_cache_dir(file_path):
+    return os.path.join(os.path.dirname(os.path.abspath(file_path)), ".cache")
+
+
+# Cache files of one source are named <stem>-<path key>-<content hash>.npz, so entries
+# for earlier contents of the same file can be found and removed
+def _cache_prefix(file_path):
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    path_key = hashlib.sha256(os.path.abspath(file_path).encode()).hexdigest()[:16]
+    return f"{stem}-{path_key}-"
+
+
+def _remove_stale_cache(cache_file, prefix):
+    for stale_file in glob.glob(os.path.join(glob.escape(os.path.dirname(cache_file)), glob.escape(prefix) + "*.npz")):
+        if stale_file != cache_file and ".tmp" not in os.path.basename(stale_file):
+            os.remove(stale_file)
+
+
+# Convert the wide Year x January..December table to the sorted long format
+def to_long(data):
+    years = data["Year"].to_numpy()
+    values = data[MONTHS].to_numpy(dtype=float)
+    order = np.argsort(years, kind="stable")
+    monthly_data = pd.DataFrame({
+        "Year": np.repeat(years[order], len(MONTHS)),
+        "Month": pd.Categorical.from_codes(np.tile(np.arange(len(MONTHS)), len(years)),
+                                           categories=MONTHS, ordered=True),
+        "Precipitation": values[order].ravel(),
+    })
+    return monthly_data
+
+
+def _read_cache(cache_file):
+    with np.load(cache_file, allow_pickle=False) as cached:
+        if int(cached["version"]) != CACHE_VERSION:
+            return None
+        data = pd.DataFrame(cached["wide_values"], columns=list(cached["wide_columns"]))
+        data.insert(0, "Year", cached["wide_years"])
+        monthly_data = pd.DataFrame({
+            "Year": cached["long_years"],
+            "Month": pd.Categorical.from_codes(cached["long_months"], categories=MONTHS, ordered=True),
+            "Precipitation": cached["long_values"],
+        })
+    return data, monthly_data
+
+
+def _write_cache(cache_file, data, monthly_data):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    value_columns = [c for c in data.columns if c != "Year"]
+    tmp_file = cache_file + ".tmp.npz"
+    np.savez(
+        tmp_file,
+        version=CACHE_VERSION,
+        wide_years=data["Year"].to_numpy(),
+        wide_columns=np.array(value_columns),
+        wide_values=data[value_columns].to_numpy(dtype=float),
+        long_years=monthly_data["Year"].to_numpy(),
+        long_months=monthly_data["Month"].cat.codes.to_numpy(),
+        long_values=monthly_data["Precipitation"].to_numpy(),
+    )
+    os.replace(tmp_file, cache_file)
+
+
+def load_precipitation(file_path, cache_dir=None, use_cache=True, zeros="clamp", floor=DEFAULT_FLOOR, station=None):
+    """
+    Loads a station file and returns the wide table and the cleaned long table.
+
+    The parsed frames are stored in a .npz file keyed by the hash of the source
+    file, so later runs on an unchanged file skip CSV parsing and reshaping; entries
+    for earlier contents of the file are removed when a new one is written.
+    The zero treatment is applied after the cache, so changing it needs no reparse.
+    A store directory (see store.py) is read directly from the memory-mapped
+    station view and needs no cache.
+
+    :param file_path: Path to the Year x January..December CSV file, or a store directory.
+    :param cache_dir: Directory for cache files (defaults to .cache next to the data).
+    :param use_cache: Set to False to always parse the CSV.
+    :param zeros: Zero treatment for the long frame ("clamp", "drop" or "mixed").
+    :param floor: Replacement value for zeros when zeros="clamp".
+    :param station: Station label in a store directory (may be omitted for a single station).
+    :return: (data, monthly_data) where data is the raw wide frame and monthly_data
+             has Year, ordered categorical Month and Precipitation columns.
+    """
+    if os.path.isdir(file_path):
+        # Imported here because store.py imports MONTHS from this module
+        from store import open_store
+        store = open_store(file_path)
+        if station is None:
+            if len(store.stations()) != 1:
+                raise ValueError("A station must be specified for a multi-station store")
+            station = store.stations()[0]
+        data = store.station_frame(station)
+        monthly_data = to_long(data)
+        monthly_data["Precipitation"] = prepare_precipitation(monthly_data["Precipitation"], zeros, floor)
+        return data, monthly_data
+
+    cached = None
+    cache_file = None
+    if use_cache:
+        cache_dir = cache_dir or default_cache_dir(file_path)
+        prefix = _cache_prefix(file_path)
+        cache_file = os.path.join(cache_dir, f"{prefix}{file_hash(file_path)}.npz")
+        if os.path.exists(cache_file):
+            cached = _read_cache(cache_file)
+
+    if cached is not None:
+        data, monthly_data = cached
+    else:
+        data = pd.read_csv(file_path)
+        # Values as float, the same dtype the cache returns
+        value_columns = [c for c in data.columns if c != "Year"]
+        data[value_columns] = data[value_columns].astype(float)
+        monthly_data = to_long(data)
+        if cache_file is not None:
+            _write_cache(cache_file, data, monthly_data)
+            _remove_stale_cache(cache_file, prefix)
+
+    monthly_data["Precipitation"] = prepare_precipitation(monthly_data["Precipitation"], zeros, floor)
+    return data, monthly_data
@@ -1,34 +1,34 @@
 import pandas as pd
 import numpy as np
-from scipy.stats import lognorm, norm, gumbel_r
+from scipy.stats import norm
 import plotly.graph_objects as go
 import os
+from aggregation import group_totals, month_matrix
+from dashboard import publish_section
+from fitting import get_distribution, mixed_cdf
+from loader import default_cache_dir, load_precipitation
+from param_cache import PARAMETER_DB, ParameterCache
+from spi import compute_spi_k, station_array
 
 # Load the data
 file_path = r"C:\\Users\\yasar\\work_space\\disrubition-and-frequency\\data\\precipitation_data.csv"
-data = pd.read_csv(file_path)
-
-# Convert monthly data to long format
-monthly_data = data.melt(id_vars=["Year"], var_name="Month", value_name="Precipitation")
-monthly_data["Month"] = pd.Categorical(
-    monthly_data["Month"],
-    categories=["January", "February", "March", "April", "May", "June",
-                "July", "August", "September", "October", "November", "December"],
-    ordered=True
-)
-monthly_data.sort_values(by=["Year", "Month"], inplace=True)
-
-# Convert zero or negative values to a positive value
-monthly_data["Precipitation"] = monthly_data["Precipitation"].apply(lambda x: x if x > 0 else 0.01)
-
-# Define month groups
+# Zero-inflated mode: keep dry months at 0 and fit H(x) = q + (1 - q) G(x), with G fitted
+# on the positive values and q the fraction of zeros, instead of clamping zeros to 0.01
+zero_inflated = False
+
+# Wide and long frames come from the shared cache (long format, zero values clamped
+# unless zero_inflated is set)
+data, monthly_data = load_precipitation(file_path, zeros="mixed" if zero_inflated else "clamp")
+
+# Fitted parameters are cached in memory and in SQLite next to the data, shared by all scripts
+parameter_cache = ParameterCache(os.path.join(default_cache_dir(file_path), PARAMETER_DB))
+
+# Month-group totals from the (years x 12) matrix in one matrix multiply; groups spanning
+# the new year (Sep-Jun) belong to the hydrological year they end in
 def group_precipitation(data, groups, group_name):
-    results = []
-    for group in groups:
-        grouped_data = data[data["Month"].isin(group)].groupby("Year")["Precipitation"].sum().reset_index()
-        grouped_data.rename(columns={"Precipitation": group_name}, inplace=True)
-        results.append(grouped_data)
-    return results
+    matrix, years = month_matrix(data)
+    totals = group_totals(matrix, groups, years)
+    return [pd.DataFrame({"Year": years, group_name: totals[:, g]}) for g in range(len(groups))]
 
 # Define period groups
 one_month_groups = [["January"], ["February"], ["March"], ["April"], ["May"], ["June"], ["July"], ["August"], ["September"], ["October"], ["November"], ["December"]]
@@ -47,26 +47,27 @@ twelve_month_totals = group_precipitation(monthly_data, twelve_month_group, "12-
 # SPI calculation function
 def calculate_spi(data, column, method="log-normal"):
     values = data[column].dropna()
-    if method == "log-normal":
-        shape, loc, scale = lognorm.fit(values, floc=0)
-        cdf = lognorm.cdf(values, shape, loc, scale)
-    elif method == "normal":
-        mean, std = norm.fit(values)
-        cdf = norm.cdf(values, mean, std)
-    elif method == "gumbel":
-        loc, scale = gumbel_r.fit(values)
-        cdf = gumbel_r.cdf(values, loc, scale)
+    # Any registered distribution (fitting.REGISTRY); unknown names raise ValueError
+    distribution = get_distribution(method)
+    if zero_inflated:
+        q, params = parameter_cache.fit_mixed(values, method, refine=True)
+        # Dry totals sit at the centre of the zero probability mass, q / 2
+        cdf = np.where(values > 0, mixed_cdf(values, q, params, method), q / 2)
     else:
-        raise ValueError("Invalid method specified")
-    
+        params = parameter_cache.fit(values, method, refine=True)
+        cdf = distribution.dist.cdf(values, *params)
     cdf = np.clip(cdf, 1e-6, 1 - 1e-6)
     spi = norm.ppf(cdf)
-    data[f"SPI ({method})"] = spi
+    # Years without a total (e.g. the first year of a cross-year group) stay NaN
+    data.loc[values.index, f"SPI ({method})"] = spi
     return data
 
+# Define methods for SPI calculation (any name registered in fitting.REGISTRY, e.g. "gamma")
+methods = ["log-normal", "normal", "gumbel"]
+
 # Add methods for SPI calculations
 def calculate_all_spi(totals_list, column):
-    for method in ["log-normal", "normal", "gumbel"]:
+    for method in methods:
         for i, df in enumerate(totals_list):
             totals_list[i] = calculate_spi(df, column, method)
 
@@ -90,6 +91,11 @@ categories = {
 output_dir = r"C:\\Users\\yasar\\work_space\\disrubition-and-frequency\\graphs\\spi-graph"
 os.makedirs(output_dir, exist_ok=True)
 
+# Report mode: put all figures into one combined station page instead of separate HTML files
+report_mode = False
+report_dir = r"C:\\Users\\yasar\\work_space\\disrubition-and-frequency\\graphs\\report"
+report_figures = []
+
 # Combine SPI plots
 def plot_combined_spi(totals_list, group_names, method, title, file_name, x_axis_label="Year", y_axis_label="SPI"):
     fig = go.Figure()
@@ -123,7 +129,10 @@ def plot_combined_spi(totals_list, group_names, method, title, file_name, x_axis
     )
 
     # Save the figure as HTML
-    fig.write_html(os.path.join(output_dir, f"{file_name}.html"))
+    if report_mode:
+        report_figures.append((title, fig))
+    else:
+        fig.write_html(os.path.join(output_dir, f"{file_name}.html"))
 
 # Group names for labeling
 one_month_group_names = [g[0] for g in one_month_groups]
@@ -132,9 +141,6 @@ six_month_group_names = ["-".join(g) for g in six_month_groups]
 ten_month_group_names = ["-".join(g) for g in ten_month_group]
 twelve_month_group_names = ["-".join(g) for g in twelve_month_group]
 
-# Define methods for SPI calculation
-methods = ["log-normal", "normal", "gumbel"]
-
 # Plot for each method
 for method in methods:
     # Combine 1-Month SPI data
@@ -182,6 +188,9 @@ for method in methods:
         f"12-Month_SPI_Comparison_{method}"
     )
 
+if report_mode:
+    publish_section(report_dir, "SPI", report_figures)
+
 # Method to save SPI data to CSV
 def save_spi_to_csv(totals_list, file_name_prefix):
     """
@@ -201,3 +210,13 @@ save_spi_to_csv(three_month_totals, "3-Month_SPI")
 save_spi_to_csv(six_month_totals, "6-Month_SPI")
 save_spi_to_csv([ten_month_totals[0]], "10-Month_SPI")
 save_spi_to_csv([twelve_month_totals[0]], "12-Month_SPI")
+
+
+# Standard SPI-k from running sums over the continuous monthly series, fitted per calendar month
+precipitation, years = station_array(data)
+rolling_spi = compute_spi_k(precipitation, scales=[1, 3, 6, 12], years=years, refine=True)
+rolling_spi_table = rolling_spi.sel(station=0).to_frame().pivot_table(
+    index=["scale", "year", "month"], columns="method", values="SPI", sort=False
+).reset_index()
+rolling_spi_table.to_csv("SPI-k_Rolling.csv", index=False)
+print("Saved: SPI-k_Rolling.csv")
@@ -0,0 +1,121 @@
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+from fitting import fit
+from preprocessing import zero_probability
+
+# Bump this when a fitter changes so parameters cached by older code are not reused
+CACHE_VERSION = 1
+
+DEFAULT_MAXSIZE = 1024
+
+PARAMETER_DB = "parameters.sqlite"
+
+
+# Hash of a series along the last axis; the values are sorted first because the fits do
+# not depend on the order, so sorted plotting series and yearly SPI series share entries
+def series_hash(values):
+    values = np.sort(np.asarray(values, dtype=float), axis=-1) + 0.0
+    values = np.where(np.isnan(values), np.nan, values)
+    digest = hashlib.sha256(str(values.shape).encode())
+    digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+
+def _to_blob(params):
+    buffer = io.BytesIO()
+    np.save(buffer, np.stack([np.asarray(p, dtype=float) for p in params]), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def _from_blob(blob):
+    return np.load(io.BytesIO(blob), allow_pickle=False)
+
+
+class ParameterCache:
+    """
+    Fitted-parameter cache keyed by (series hash, distribution, fit method).
+
+    Lookups go to a bounded in-memory LRU first and then to an SQLite file, so
+    a fit is computed once across scripts and runs that use the same file. The
+    database is only opened by the first lookup.
+    """
+
+    def __init__(self, path=None, maxsize=DEFAULT_MAXSIZE):
+        self.path = path
+        self.maxsize = maxsize
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+    # Open the SQLite file on first use; call with the lock held
+    def _connect(self):
+        if self._db is None and self.path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS parameters (key TEXT PRIMARY KEY, params BLOB NOT NULL)")
+            self._db.commit()
+        return self._db
+
+    def _remember(self, key, stacked):
+        stacked.setflags(write=False)
+        self._memory[key] = stacked
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return tuple(self._memory[key])
+            if self._connect() is None:
+                return None
+            row = self._db.execute("SELECT params FROM parameters WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            stacked = _from_blob(row[0])
+            self._remember(key, stacked)
+            return tuple(stacked)
+
+    def put(self, key, params):
+        blob = _to_blob(params)
+        with self._lock:
+            self._remember(key, _from_blob(blob))
+            if self._connect() is not None:
+                self._db.execute("INSERT OR REPLACE INTO parameters (key, params) VALUES (?, ?)", (key, blob))
+                self._db.commit()
+
+    def fit(self, values, distribution, estimator="lmoments", refine=False):
+        """
+        fitting.fit through the cache.
+
+        :param values: Array of samples, fitted along the last axis; NaN entries are ignored.
+        :param distribution: Name of a registered distribution.
+        :param estimator: Gumbel estimator, "lmoments" or "moments".
+        :param refine: Refine the fit to the maximum likelihood estimate.
+        :return: Parameters in scipy order, each with the leading shape of values.
+        """
+        values = np.asarray(values, dtype=float)
+        key = f"{CACHE_VERSION}:{distribution}:{estimator}:{int(bool(refine))}:{series_hash(values)}"
+        params = self.get(key)
+        if params is None:
+            params = fit(values, distribution, estimator, refine)
+            self.put(key, params)
+        return params
+
+    # fitting.fit_mixed through the cache: only G is cached, q is a cheap count
+    def fit_mixed(self, values, distribution, estimator="lmoments", refine=False):
+        values = np.asarray(values, dtype=float)
+        params = self.fit(np.where(values > 0, values, np.nan), distribution, estimator, refine)
+        return zero_probability(values, axis=-1), params
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,42 @@
+import numpy as np
+
+# Ways of treating zero (or negative) precipitation before fitting
+ZERO_TREATMENTS = ("clamp", "drop", "mixed")
+
+DEFAULT_FLOOR = 0.01
+
+
+# Replace zero or negative values with a small positive floor in one vectorized step
+def clamp_zeros(values, floor=DEFAULT_FLOOR):
+    values = np.asarray(values, dtype=float)
+    return np.where(values > 0, values, floor)
+
+
+# Fraction of non-positive observations (ignoring NaN), the q of H(x) = q + (1 - q) G(x)
+def zero_probability(values, axis=None):
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    zeros = (values <= 0) & valid
+    return zeros.sum(axis=axis) / np.maximum(valid.sum(axis=axis), 1)
+
+
+def prepare_precipitation(values, zeros="clamp", floor=DEFAULT_FLOOR):
+    """
+    Applies the configured zero treatment to an array of precipitation values.
+
+    :param values: Array of any shape.
+    :param zeros: "clamp" replaces non-positive values with floor, "drop" marks them
+                  as NaN so they are removed by the usual dropna, and "mixed" sets them
+                  to exactly 0 for the zero-inflated fits in fitting.fit_mixed.
+    :param floor: Replacement value used by "clamp".
+    :return: Array of the same shape as values.
+    """
+    values = np.asarray(values, dtype=float)
+    if zeros == "clamp":
+        return clamp_zeros(values, floor)
+    elif zeros == "drop":
+        return np.where(values > 0, values, np.nan)
+    elif zeros == "mixed":
+        return np.where(np.isnan(values) | (values > 0), values, 0.0)
+    else:
+        raise ValueError("Invalid zero treatment specified")
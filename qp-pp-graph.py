@@ -1,15 +1,29 @@
 import os
-import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
+from dashboard import publish_section
+from loader import load_precipitation
+from sketch import DEFAULT_COMPRESSION, PLOT_POINTS, QuantileSketch
 
 # Load the data
-data = pd.read_csv(r"C:\Users\yasar\work_space\disrubition-and-frequency\data\precipitation_data.csv")
+data, _ = load_precipitation(r"C:\Users\yasar\work_space\disrubition-and-frequency\data\precipitation_data.csv")
 
 # Directory where the graphs will be saved
 graphs_path = r"C:\Users\yasar\work_space\disrubition-and-frequency\graphs\qp-pp"
 os.makedirs(graphs_path, exist_ok=True)
 
+# Report mode: put all figures into one combined station page instead of separate HTML files
+report_mode = False
+report_dir = r"C:\Users\yasar\work_space\disrubition-and-frequency\graphs\report"
+report_figures = []
+
+# Quantile-sketch mode: answer the plotting positions from a mergeable QuantileSketch
+# (bounded memory, about 1 / sketch_compression rank error, at most sketch_points
+# points) instead of sorting every month; sketch points carry no year in the hover text
+quantile_sketch = False
+sketch_compression = DEFAULT_COMPRESSION
+sketch_points = PLOT_POINTS
+
 # Columns represent months (excluding the first column which is Year)
 months = data.columns[1:]
 
@@ -21,13 +35,19 @@ def calculate_probabilities(precipitation):
 
 # Creating graphs for each month
 for month in months:
-    monthly_data = data[["Year", month]].dropna()  # Remove NaN values
-    sorted_data = monthly_data.sort_values(by=month)
-    precipitation = sorted_data[month].values  # Precipitation data (Qp)
-    years = sorted_data["Year"].values
+    if quantile_sketch:
+        sketch = QuantileSketch(sketch_compression).add(data[month])
+        precipitation, probabilities = sketch.plotting_positions(sketch_points)
+        text = [f'Qp: {v:.2f}<br>Probability: {p:.2f}' for p, v in zip(probabilities, precipitation)]
+    else:
+        monthly_data = data[["Year", month]].dropna()  # Remove NaN values
+        sorted_data = monthly_data.sort_values(by=month)
+        precipitation = sorted_data[month].values  # Precipitation data (Qp)
+        years = sorted_data["Year"].values
 
-    # Calculate probabilities
-    probabilities = calculate_probabilities(precipitation)
+        # Calculate probabilities
+        probabilities = calculate_probabilities(precipitation)
+        text = [f'Year: {y}<br>Qp: {v:.2f}<br>Probability: {p:.2f}' for y, p, v in zip(years, probabilities, precipitation)]
 
     # Create the graph
     fig = go.Figure()
@@ -35,7 +55,7 @@ for month in months:
     # Rainfall (Qp) vs Probability (PP) plot
     fig.add_trace(go.Scatter(x=probabilities, y=precipitation, mode='markers+lines', name=month,
                              marker=dict(color='blue'),
-                             text=[f'Year: {y}<br>Qp: {v:.2f}<br>Probability: {p:.2f}' for y, p, v in zip(years, probabilities, precipitation)],
+                             text=text,
                              hoverinfo='text'))
 
     # Layout adjustments
@@ -48,7 +68,13 @@ for month in months:
     )
     
     # Save the graph
-    file_path = os.path.join(graphs_path, f"{month}_rainfall_probability_plot.html")
-    fig.write_html(file_path)
+    if report_mode:
+        report_figures.append((month, fig))
+    else:
+        file_path = os.path.join(graphs_path, f"{month}_rainfall_probability_plot.html")
+        fig.write_html(file_path)
+
+if report_mode:
+    publish_section(report_dir, "Rainfall vs Probability", report_figures)
 
 print("Graphs have been successfully saved.")
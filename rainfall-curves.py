@@ -1,30 +1,42 @@
 import pandas as pd
 import numpy as np
-from scipy.stats import lognorm, norm, gumbel_r
 import plotly.graph_objects as go
 import os
+from aggregation import group_totals, month_matrix
+from fitting import get_distribution, mixed_cdf
+from bootstrap import quantile_band
+from loader import default_cache_dir, load_precipitation
+from param_cache import PARAMETER_DB, ParameterCache
+from rendering import render_figures
 
 # Load the data
 file_path = r"C:\\Users\\yasar\\work_space\\disrubition-and-frequency\\data\\precipitation_data.csv"
-data = pd.read_csv(file_path)
+# Zero-inflated mode: keep dry months at 0 and fit H(x) = q + (1 - q) G(x), with G fitted
+# on the positive values and q the fraction of zeros, instead of clamping zeros to 0.01
+zero_inflated = False
 
-# Convert monthly data to long format
-monthly_data = data.melt(id_vars=["Year"], var_name="Month", value_name="Precipitation")
-monthly_data["Month"] = pd.Categorical(
-    monthly_data["Month"],
-    categories=["January", "February", "March", "April", "May", "June",
-                "July", "August", "September", "October", "November", "December"],
-    ordered=True
-)
-monthly_data.sort_values(by=["Year", "Month"], inplace=True)
-
-# Convert zero or negative values to a positive value
-monthly_data["Precipitation"] = monthly_data["Precipitation"].apply(lambda x: x if x > 0 else 0.01)
+# Wide and long frames come from the shared cache (long format, zero values clamped
+# unless zero_inflated is set)
+data, monthly_data = load_precipitation(file_path, zeros="mixed" if zero_inflated else "clamp")
 
 # Directory to save graphs
 output_dir = r"C:\\Users\\yasar\\work_space\\disrubition-and-frequency\\graphs\\precipitation-curves"
 os.makedirs(output_dir, exist_ok=True)
 
+# Rendering options: worker processes (None uses all cores) and one shared plotly.js
+# file per output directory instead of embedding ~3.5 MB in every HTML
+render_workers = None
+shared_plotlyjs = False
+render_jobs = []
+
+# Distributions to fit and plot (any name registered in fitting.REGISTRY, e.g. "gev")
+plot_methods = ["log-normal", "normal", "gumbel"]
+
+# Bootstrap confidence bands on the fitted curves (set bootstrap_replicates = 0 to disable)
+bootstrap_replicates = 10_000
+bootstrap_seed = 12345
+confidence_level = 0.95
+
 # Define time period groups
 period_groups = {
   #  "1-Month": [["January"], ["February"], ["March"], ["April"], ["May"], ["June"],
@@ -39,14 +51,16 @@ period_groups = {
                   "July", "August", "September", "October", "November", "December"]],
 }
 
-# Group precipitation by periods
+# Group precipitation by periods with one matrix multiply over the (years x 12) matrix;
+# groups spanning the new year (Sep-Jun) belong to the hydrological year they end in
 def group_precipitation(data, groups, group_name):
-    results = []
-    for group in groups:
-        grouped_data = data[data["Month"].isin(group)].groupby("Year")["Precipitation"].sum().reset_index()
-        grouped_data.rename(columns={"Precipitation": group_name}, inplace=True)
-        results.append(grouped_data)
-    return pd.concat(results, keys=range(len(groups)), names=["Group", "Index"]).reset_index()
+    matrix, years = month_matrix(data)
+    totals = group_totals(matrix, groups, years)
+    return pd.DataFrame({
+        "Group": np.repeat(np.arange(len(groups)), len(years)),
+        "Year": np.tile(years, len(groups)),
+        group_name: totals.T.ravel(),
+    })
 
 # Process all period groups
 period_data = {}
@@ -54,7 +68,7 @@ for period_name, groups in period_groups.items():
     period_data[period_name] = group_precipitation(monthly_data, groups, f"{period_name} Total")
 
 # Probability distribution plotting for Normal, Log-Normal, and Gumbel
-def plot_distribution(period, sorted_data, probabilities, x_fit, cdf_fit, method_name, color, file_suffix):
+def build_distribution_figure(period, sorted_data, probabilities, x_fit, cdf_fit, method_name, color, band=None):
     # Create the plot
     fig = go.Figure()
 
@@ -78,6 +92,27 @@ def plot_distribution(period, sorted_data, probabilities, x_fit, cdf_fit, method
         line=dict(color=color)
     ))
 
+    # Bootstrap confidence band around the fit line
+    if band is not None:
+        lower, upper = band
+        fig.add_trace(go.Scatter(
+            x=cdf_fit * 100,
+            y=upper,
+            mode='lines',
+            line=dict(color=color, width=0),
+            showlegend=False,
+            hoverinfo='skip'
+        ))
+        fig.add_trace(go.Scatter(
+            x=cdf_fit * 100,
+            y=lower,
+            mode='lines',
+            line=dict(color=color, width=0),
+            fill='tonexty',
+            opacity=0.25,
+            name=f'{confidence_level:.0%} Confidence Band'
+        ))
+
     # Layout adjustments
     fig.update_layout(
         title=f"{method_name} Distribution for {period}",
@@ -88,34 +123,44 @@ def plot_distribution(period, sorted_data, probabilities, x_fit, cdf_fit, method
         yaxis=dict( type= 'log')
     )
 
-    # Save plot as HTML
+    return fig
+
+# Queue the plot; figures are built and saved together by render_figures
+def plot_distribution(period, sorted_data, probabilities, x_fit, cdf_fit, method_name, color, file_suffix, band=None):
     file_name = os.path.join(output_dir, f"{method_name}_Probability_{file_suffix}_{period}.html")
-    fig.write_html(file_name)
-
-# Generate plots for each period
-for period_name, data in period_data.items():
-    for group in data["Group"].unique():
-        group_data = data[data["Group"] == group][f"{period_name} Total"].dropna()
-
-        if len(group_data) > 0:
-            # Sort data
-            sorted_data = np.sort(group_data)
-            probabilities = 100 * (np.arange(1, len(sorted_data) + 1) / (len(sorted_data) + 1))
-
-            # Log-Normal Distribution
-            shape, loc, scale = lognorm.fit(sorted_data, floc=0)
-            x_fit = np.linspace(sorted_data.min(), sorted_data.max(), 100)
-            cdf_fit = lognorm.cdf(x_fit, shape, loc, scale)
-            plot_distribution(f"{period_name} Group {group}", sorted_data, probabilities, x_fit, cdf_fit, "Log-Normal", "red", "lognormal")
-
-            # Normal Distribution
-            mean, std = norm.fit(sorted_data)
-            cdf_fit = norm.cdf(x_fit, mean, std)
-            plot_distribution(f"{period_name} Group {group}", sorted_data, probabilities, x_fit, cdf_fit, "Normal", "green", "normal")
-
-            # Gumbel Distribution
-            loc, scale = gumbel_r.fit(sorted_data)
-            cdf_fit = gumbel_r.cdf(x_fit, loc, scale)
-            plot_distribution(f"{period_name} Group {group}", sorted_data, probabilities, x_fit, cdf_fit, "Gumbel", "purple", "gumbel")
-
-print("Probability vs Precipitation plots for Log-Normal, Normal, and Gumbel distributions by periods have been generated and saved.")
+    render_jobs.append((build_distribution_figure, (period, sorted_data, probabilities, x_fit, cdf_fit, method_name, color, band), file_name))
+
+# Workers import this file, so the plots are only generated when it is run directly
+if __name__ == "__main__":
+    # Fitted parameters are cached in memory and in SQLite next to the data, shared by all
+    # scripts; created here so render workers importing this file do not open the database
+    parameter_cache = ParameterCache(os.path.join(default_cache_dir(file_path), PARAMETER_DB))
+
+    # Generate plots for each period
+    for period_name, data in period_data.items():
+        for group in data["Group"].unique():
+            group_data = data[data["Group"] == group][f"{period_name} Total"].dropna()
+
+            if len(group_data) > 0:
+                # Sort data
+                sorted_data = np.sort(group_data)
+                probabilities = 100 * (np.arange(1, len(sorted_data) + 1) / (len(sorted_data) + 1))
+
+                # Curve over the positive range (zeros are the point mass q in zero-inflated mode)
+                x_fit = np.linspace(sorted_data[sorted_data > 0].min(), sorted_data.max(), 100)
+
+                # Fit and plot every distribution through the registry
+                for method in plot_methods:
+                    distribution = get_distribution(method)
+                    if zero_inflated:
+                        q, params = parameter_cache.fit_mixed(sorted_data, method, refine=True)
+                        cdf_fit = mixed_cdf(x_fit, q, params, method)
+                    else:
+                        params = parameter_cache.fit(sorted_data, method, refine=True)
+                        cdf_fit = distribution.dist.cdf(x_fit, *params)
+                    band = quantile_band(sorted_data, method, cdf_fit, bootstrap_replicates, confidence_level, bootstrap_seed, zero_inflated, refine=True) if bootstrap_replicates else None
+                    plot_distribution(f"{period_name} Group {group}", sorted_data, probabilities, x_fit, cdf_fit, distribution.label, distribution.color, distribution.file_suffix, band)
+
+    render_figures(render_jobs, workers=render_workers, shared_plotlyjs=shared_plotlyjs)
+
+    print("Probability vs Precipitation plots for Log-Normal, Normal, and Gumbel distributions by periods have been generated and saved.")
@@ -0,0 +1,333 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from scipy.stats import norm
+from fitting import DISTRIBUTIONS, cdf, fit, fit_mixed, mixed_cdf
+from grid import DEFAULT_TILE, SPI_SCALES, run_grid
+from ingest import ingest_daily, write_station_files
+from loader import file_hash, load_precipitation
+from rendering import render_figures
+from spi import DROUGHT_CATEGORIES, PERIOD_GROUPS, month_group_totals, spi_categories, station_array
+from store import DEFAULT_CHUNKSIZE, FREQUENCIES, convert_long_csv, convert_station_files, store_hash
+
+# Bump this when a stage's output changes so old pipeline state is ignored
+PIPELINE_VERSION = 4
+
+STATE_DIR = ".pipeline"
+MANIFEST_FILE = "manifest.json"
+
+
+class Stage:
+    """
+    One node of the pipeline DAG.
+
+    run(config, *inputs) receives the results of the stages named in inputs, and
+    params lists the config entries that change its result (part of the stage key).
+    """
+
+    def __init__(self, name, run, inputs=(), params=()):
+        self.name = name
+        self.run = run
+        self.inputs = tuple(inputs)
+        self.params = tuple(params)
+
+
+def _load(config):
+    _, monthly_data = load_precipitation(config["input"], zeros="mixed" if config["zero_inflated"] else "clamp",
+                                         station=config.get("station"))
+    # Back to the (1, years, 12) array with the treated values
+    wide = monthly_data.pivot(index="Year", columns="Month", values="Precipitation").reset_index()
+    precipitation, years = station_array(wide)
+    return {"precipitation": precipitation, "years": years}
+
+
+def _aggregate(config, loaded):
+    totals = {window: month_group_totals(loaded["precipitation"], groups, loaded["years"])[0]
+              for window, groups in PERIOD_GROUPS.items()}
+    return {"years": loaded["years"], "totals": totals}
+
+
+def _fit(config, aggregated):
+    fitted = {}
+    for method in config["methods"]:
+        for window, totals in aggregated["totals"].items():
+            if config["zero_inflated"]:
+                q, params = fit_mixed(totals, method, refine=True)
+                fitted[method, window] = (q, params)
+            else:
+                fitted[method, window] = (None, fit(totals, method, refine=True))
+    return fitted
+
+
+def _spi(config, aggregated, fitted):
+    frames = []
+    for (method, window), (q, params) in fitted.items():
+        totals = aggregated["totals"][window]
+        if q is None:
+            probabilities = cdf(totals, params, method)
+        else:
+            # Dry totals sit at q / 2; missing totals (e.g. the first Sep-Jun year) stay missing
+            probabilities = np.where(np.isnan(totals), np.nan,
+                                     np.where(totals > 0, mixed_cdf(totals, q, params, method), q[:, np.newaxis] / 2))
+        values = norm.ppf(np.clip(probabilities, 1e-6, 1 - 1e-6))
+        groups, years = np.meshgrid(np.arange(1, len(totals) + 1), aggregated["years"], indexing="ij")
+        frames.append(pd.DataFrame({
+            "Method": method,
+            "Window": window,
+            "Group": groups.ravel(),
+            "Year": years.ravel(),
+            "Total": totals.ravel(),
+            "SPI": values.ravel(),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _classify(config, spi):
+    classified = spi.assign(Category=spi_categories(spi["SPI"]))
+    counts = classified.groupby(["Method", "Window", "Category"], sort=False).size().unstack(fill_value=0)
+    return counts.reindex(columns=list(DROUGHT_CATEGORIES), fill_value=0).reset_index()
+
+
+# Grouped SPI bars per year with the drought category lines, as in normal-lognormal-gumbal-spi.py
+def build_spi_figure(window, method, spi):
+    fig = go.Figure()
+    group_names = ["-".join(group) for group in PERIOD_GROUPS[window]]
+    for group, group_spi in spi.groupby("Group"):
+        fig.add_trace(go.Bar(x=group_spi["Year"], y=group_spi["SPI"], name=group_names[group - 1]))
+    years = np.unique(spi["Year"])
+    for category, value in DROUGHT_CATEGORIES.items():
+        fig.add_trace(go.Scatter(x=years, y=[value] * len(years), mode="lines", line=dict(dash="dot"), name=category))
+    fig.update_layout(
+        title=f"{window} SPI Comparison ({method.capitalize()})",
+        xaxis_title="Year",
+        yaxis_title="SPI",
+        template="plotly_white",
+        barmode="group"
+    )
+    return fig
+
+
+def _plot(config, spi):
+    output_dir = os.path.join(config["out"], "graphs")
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = []
+    for (method, window), group_spi in spi.groupby(["Method", "Window"], sort=False):
+        file_name = os.path.join(output_dir, f"{window}_SPI_Comparison_{method}.html")
+        jobs.append((build_spi_figure, (window, method, group_spi), file_name))
+    return render_figures(jobs, workers=config["workers"], shared_plotlyjs=config["shared_plotlyjs"])
+
+
+def _export(config, fitted, spi, categories):
+    output_dir = os.path.join(config["out"], "tables")
+    os.makedirs(output_dir, exist_ok=True)
+    rows = []
+    for (method, window), (q, params) in fitted.items():
+        for g in range(len(params[0])):
+            row = {"Method": method, "Window": window, "Group": g + 1}
+            if q is not None:
+                row["q"] = q[g]
+            row.update({f"Parameter {i + 1}": p[g] for i, p in enumerate(params)})
+            rows.append(row)
+    files = {
+        "fitted_parameters.csv": pd.DataFrame(rows),
+        "spi.csv": spi,
+        "spi_categories.csv": categories,
+    }
+    written = []
+    for file_name, table in files.items():
+        path = os.path.join(output_dir, file_name)
+        table.to_csv(path, index=False)
+        written.append(path)
+    return written
+
+
+STAGES = [
+    Stage("load", _load, params=("input", "station", "zero_inflated")),
+    Stage("aggregate", _aggregate, inputs=("load",)),
+    Stage("fit", _fit, inputs=("aggregate",), params=("methods", "zero_inflated")),
+    Stage("spi", _spi, inputs=("aggregate", "fit")),
+    Stage("classify", _classify, inputs=("spi",)),
+    Stage("plot", _plot, inputs=("spi",), params=("shared_plotlyjs",)),
+    Stage("export", _export, inputs=("fit", "spi", "classify")),
+]
+
+
+# Key of a stage run: its name, the relevant config and the content hashes of its inputs
+def stage_key(stage, config, input_hashes):
+    params = {name: config.get(name) for name in stage.params}
+    if "input" in params:
+        params["input"] = store_hash(config["input"]) if os.path.isdir(config["input"]) else file_hash(config["input"])
+    key = json.dumps([PIPELINE_VERSION, stage.name, params, [input_hashes[name] for name in stage.inputs]],
+                     sort_keys=True, default=str)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+# Stages that return a list of written files are only up to date while those files exist
+def _outputs_exist(entry):
+    return all(os.path.exists(path) for path in entry.get("files", []))
+
+
+def _read_manifest(state_dir):
+    try:
+        with open(os.path.join(state_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(state_dir, manifest):
+    tmp_file = os.path.join(state_dir, MANIFEST_FILE + ".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, os.path.join(state_dir, MANIFEST_FILE))
+
+
+def run_pipeline(config, stages=STAGES, force=False, jobs=None, log=print):
+    """
+    Runs the pipeline DAG, skipping stages whose inputs have not changed.
+
+    Each stage result is pickled under <out>/.pipeline with the sha256 of its bytes.
+    A stage is up to date when its key (config entries plus input content hashes)
+    matches the manifest, so a stage that reruns with identical output does not
+    invalidate the stages after it. Stages whose inputs are ready run concurrently.
+
+    :param config: Dictionary with input, out, methods, zero_inflated, workers and shared_plotlyjs.
+    :param stages: Stage list in dependency order.
+    :param force: Rerun every stage.
+    :param jobs: Number of stages run at the same time (None lets the executor decide).
+    :param log: Callable used for progress messages.
+    :return: Dictionary of stage name to "ran" or "up to date".
+    """
+    state_dir = os.path.join(config["out"], STATE_DIR)
+    os.makedirs(state_dir, exist_ok=True)
+    manifest = _read_manifest(state_dir)
+    by_name = {stage.name: stage for stage in stages}
+    results = {}
+    hashes = {}
+    status = {}
+
+    def result_of(name):
+        if name not in results:
+            with open(os.path.join(state_dir, f"{name}.pkl"), "rb") as f:
+                results[name] = pickle.load(f)
+        return results[name]
+
+    def execute(stage):
+        key = stage_key(stage, config, hashes)
+        entry = manifest.get(stage.name, {})
+        pickle_file = os.path.join(state_dir, f"{stage.name}.pkl")
+        if not force and entry.get("key") == key and os.path.exists(pickle_file) and _outputs_exist(entry):
+            return stage.name, entry, "up to date"
+        result = stage.run(config, *[result_of(name) for name in stage.inputs])
+        data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(pickle_file + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(pickle_file + ".tmp", pickle_file)
+        results[stage.name] = result
+        entry = {"key": key, "hash": hashlib.sha256(data).hexdigest()}
+        if isinstance(result, list):
+            entry["files"] = result
+        return stage.name, entry, "ran"
+
+    pending = dict(by_name)
+    running = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(dependency in hashes for dependency in stage.inputs):
+                    running[pool.submit(execute, stage)] = name
+                    del pending[name]
+            if not running:
+                raise ValueError("Pipeline stages have unknown or circular inputs")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                del running[future]
+                name, entry, outcome = future.result()
+                hashes[name] = entry["hash"]
+                status[name] = outcome
+                manifest[name] = entry
+                _write_manifest(state_dir, manifest)
+                log(f"{name}: {outcome}")
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="rainfreq", description="Rainfall distribution and frequency pipeline.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="Run the load, aggregate, fit, SPI, classify, plot and export stages.")
+    run.add_argument("--input", required=True, help="Year x January..December precipitation CSV or a store directory.")
+    run.add_argument("--station", default=None, help="Station to analyse from a multi-station store.")
+    run.add_argument("--out", required=True, help="Output directory for graphs, tables and pipeline state.")
+    run.add_argument("--methods", nargs="+", default=list(DISTRIBUTIONS), help="Registered distributions to fit.")
+    run.add_argument("--zero-inflated", action="store_true", help="Fit H(x) = q + (1 - q) G(x) instead of clamping zeros.")
+    run.add_argument("--workers", type=int, default=None, help="Worker processes for rendering.")
+    run.add_argument("--jobs", type=int, default=None, help="Stages run at the same time.")
+    run.add_argument("--shared-plotlyjs", action="store_true", help="Write one plotly.min.js next to the graphs.")
+    run.add_argument("--force", action="store_true", help="Rerun every stage.")
+    convert = commands.add_parser("convert", help="Convert station CSV files to the memory-mapped store.")
+    convert.add_argument("--input", nargs="+", required=True,
+                         help="One long CSV, or wide station files as LABEL=PATH.")
+    convert.add_argument("--store", required=True, help="Store directory.")
+    convert.add_argument("--frequency", choices=FREQUENCIES, default="monthly", help="Frequency of a long CSV.")
+    convert.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows read per chunk.")
+    ingest = commands.add_parser("ingest", help="Stream daily gauge records into monthly station files.")
+    ingest.add_argument("--input", required=True, help="Daily CSV or text feed with Station, Date and Precipitation.")
+    ingest.add_argument("--out", required=True, help="Directory for the station files and annual_maxima.csv.")
+    ingest.add_argument("--sep", default=",", help="Field separator (\\s+ for whitespace separated text).")
+    ingest.add_argument("--station", default=None, help="Station label for single-gauge files.")
+    ingest.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows read per chunk.")
+    ingest.add_argument("--min-days", type=int, default=1, help="Valid days needed for a monthly total.")
+    grid = commands.add_parser("grid", help="Per-cell SPI and return-period maps of a gridded precipitation cube.")
+    grid.add_argument("--input", required=True, help="Grid store directory or NetCDF/Zarr monthly cube.")
+    grid.add_argument("--out", required=True, help="Output directory for the .npy maps.")
+    grid.add_argument("--variable", default="precipitation", help="Precipitation variable of a NetCDF/Zarr cube.")
+    grid.add_argument("--methods", nargs="+", default=list(DISTRIBUTIONS), help="Registered distributions to fit.")
+    grid.add_argument("--scales", nargs="+", type=int, default=list(SPI_SCALES), help="SPI accumulation periods in months.")
+    grid.add_argument("--tile", nargs=2, type=int, default=list(DEFAULT_TILE), help="Grid cells (lat, lon) per tile.")
+    grid.add_argument("--workers", type=int, default=None, help="Worker processes for the tiles.")
+    args = parser.parse_args(argv)
+
+    if args.command == "grid":
+        index = run_grid(args.input, args.out, args.methods, args.scales, tile=args.tile,
+                         workers=args.workers, variable=args.variable)
+        for file_name in index["maps"].values():
+            print(f"Saved: {file_name}")
+        return
+
+    if args.command == "ingest":
+        aggregator = ingest_daily(args.input, args.chunksize, args.sep, station=args.station,
+                                  station_column=None if args.station else "Station")
+        for file_name in write_station_files(aggregator, args.out, args.min_days).values():
+            print(f"Saved: {file_name}")
+        return
+
+    if args.command == "convert":
+        if all("=" in item for item in args.input):
+            files = dict(item.split("=", 1) for item in args.input)
+            print(f"Saved: {convert_station_files(files, args.store)}")
+        elif len(args.input) == 1:
+            print(f"Saved: {convert_long_csv(args.input[0], args.store, args.frequency, args.chunksize)}")
+        else:
+            parser.error("--input takes one long CSV or LABEL=PATH station files")
+        return
+
+    config = {
+        "input": os.path.abspath(args.input),
+        "station": args.station,
+        "out": os.path.abspath(args.out),
+        "methods": args.methods,
+        "zero_inflated": args.zero_inflated,
+        "workers": args.workers,
+        "shared_plotlyjs": args.shared_plotlyjs,
+    }
+    run_pipeline(config, force=args.force, jobs=args.jobs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from plotly.offline import get_plotlyjs
+
+PLOTLYJS_FILE = "plotly.min.js"
+
+
+# Write plotly.js once next to the figures so they can reference it instead of embedding it
+def write_plotlyjs(output_dir):
+    bundle_path = os.path.join(output_dir, PLOTLYJS_FILE)
+    if not os.path.exists(bundle_path):
+        with open(bundle_path, "w", encoding="utf-8") as f:
+            f.write(get_plotlyjs())
+    return bundle_path
+
+
+def write_figure(fig, file_name, shared_plotlyjs=False):
+    fig.write_html(file_name, include_plotlyjs="directory" if shared_plotlyjs else True)
+
+
+def _render_job(job):
+    build, args, file_name, shared_plotlyjs = job
+    write_figure(build(*args), file_name, shared_plotlyjs)
+    return file_name
+
+
+def render_figures(jobs, workers=None, shared_plotlyjs=False):
+    """
+    Builds and writes figures in a process pool.
+
+    Builder functions must be importable by the workers, so scripts that call this
+    should do so under an ``if __name__ == "__main__":`` guard.
+
+    :param jobs: Iterable of (build, args, file_name); build(*args) returns a plotly figure.
+    :param workers: Number of worker processes (None uses all cores, 1 renders serially).
+    :param shared_plotlyjs: Reference one plotly.min.js per output directory instead of
+                            embedding the library in every HTML file.
+    :return: List of written file names.
+    """
+    jobs = [(build, args, file_name, shared_plotlyjs) for build, args, file_name in jobs]
+    if shared_plotlyjs:
+        for directory in {os.path.dirname(os.path.abspath(job[2])) for job in jobs}:
+            write_plotlyjs(directory)
+
+    if workers == 1 or len(jobs) <= 1:
+        return [_render_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_render_job, jobs, chunksize=max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))))
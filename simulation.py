@@ -0,0 +1,71 @@
+import numpy as np
+from fitting import scipy_distribution
+
+DEFAULT_SEED = 12345
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+DEFAULT_RETURN_PERIODS = (2, 5, 10, 50, 100)
+
+# Bins of the running histogram used for quantiles of the simulated values
+HISTOGRAM_BINS = 1 << 16
+
+
+def simulate(distribution, params, draws=1000, slots=12, seed=DEFAULT_SEED, chunk_size=250_000,
+             quantiles=DEFAULT_QUANTILES, return_periods=DEFAULT_RETURN_PERIODS, threshold=None):
+    """
+    Monte Carlo simulation of a fitted distribution in bounded memory.
+
+    Draws (slots x draws) values in chunks from a seeded numpy Generator, so the same
+    seed and settings always give the same result. Quantiles come from a fine running
+    histogram, so memory does not grow with the number of draws.
+
+    :param distribution: "log-normal", "normal" or "gumbel".
+    :param params: Parameters in scipy order, as returned by fitting.fit.
+    :param draws: Number of draws per slot (up to 10^7).
+    :param slots: Number of independent series (12 for the monthly table).
+    :param seed: Seed for numpy.random.default_rng.
+    :param chunk_size: Draws per slot generated at once.
+    :param quantiles: Non-exceedance probabilities to summarize.
+    :param return_periods: Return periods T (years) to summarize as the 1 - 1/T quantile.
+    :param threshold: Optional value whose empirical return period is computed.
+    :return: Dictionary with slot means, quantiles, return-period values and threshold return period.
+    """
+    dist = scipy_distribution(distribution)
+    params = tuple(float(p) for p in params)
+    rng = np.random.default_rng(seed)
+
+    # Histogram range covering all but a 1e-9 tail on each side
+    low, high = dist.ppf([1e-9, 1 - 1e-9], *params)
+    edges = np.linspace(low, high, HISTOGRAM_BINS + 1)
+    width = (high - low) / HISTOGRAM_BINS
+    counts = np.zeros(HISTOGRAM_BINS + 2, dtype=np.int64)
+
+    sums = np.zeros(slots)
+    exceedances = 0
+    for start in range(0, draws, chunk_size):
+        size = min(chunk_size, draws - start)
+        sample = dist.rvs(*params, size=(slots, size), random_state=rng)
+        sums += sample.sum(axis=1)
+        # Uniform bins, so the bin index is computed directly instead of searched
+        index = np.floor((sample.ravel() - low) / width).astype(np.int64) + 1
+        counts += np.bincount(np.clip(index, 0, HISTOGRAM_BINS + 1), minlength=len(counts))
+        if threshold is not None:
+            exceedances += int((sample > threshold).sum())
+
+    total = slots * draws
+    probabilities = np.concatenate([np.asarray(quantiles, dtype=float),
+                                    1 - 1 / np.asarray(return_periods, dtype=float)])
+    cumulative = np.cumsum(counts) / total
+    # counts[i] holds values in [edges[i - 1], edges[i]); interpolate inside the bin
+    index = np.clip(np.searchsorted(cumulative, probabilities, side="left"), 1, HISTOGRAM_BINS)
+    below = cumulative[index - 1]
+    fraction = np.clip((probabilities - below) / np.maximum(cumulative[index] - below, 1e-300), 0, 1)
+    values = edges[index - 1] + fraction * (edges[index] - edges[index - 1])
+
+    result = {
+        "slot_means": sums / draws,
+        "quantiles": dict(zip(quantiles, values[:len(quantiles)])),
+        "return_period_values": dict(zip(return_periods, values[len(quantiles):])),
+    }
+    if threshold is not None:
+        result["threshold_return_period"] = total / exceedances if exceedances else np.inf
+    return result
@@ -0,0 +1,109 @@
+import numpy as np
+
+DEFAULT_COMPRESSION = 100
+
+# Plotting positions returned for series longer than this
+PLOT_POINTS = 200
+
+
+class QuantileSketch:
+    """
+    Mergeable t-digest style quantile sketch with constant memory.
+
+    Values are buffered and compressed into weighted centroids sized by the arcsine
+    scale function k(q) = compression / (2 pi) asin(2q - 1). One unit of k spans
+    2 pi sqrt(q (1 - q)) / compression in q, so a centroid holds about
+    pi x count / compression values in the middle and far fewer in the tails (the
+    outermost about (pi / compression)^2 x count). Interpolating between centroid
+    centres keeps the rank error within about half a centroid, pi / (2 x compression)
+    in the middle (1.6% at the default 100) and less towards the tails. Memory is
+    bounded by 10 x compression values; series shorter than that are kept exactly.
+    """
+
+    def __init__(self, compression=DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._buffer = []
+        self._buffered = 0
+
+    @property
+    def capacity(self):
+        return 10 * self.compression
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.count += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._buffer.append(values)
+        self._buffered += len(values)
+        if len(self.means) + self._buffered > self.capacity:
+            self._compress()
+        return self
+
+    # Sort the buffer into the centroids; merge neighbours that share a unit of k
+    def _compress(self, merge=True):
+        means = np.concatenate([self.means] + self._buffer)
+        weights = np.concatenate([self.weights, np.ones(self._buffered)])
+        self._buffer = []
+        self._buffered = 0
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        if merge:
+            q = (np.cumsum(weights) - weights / 2) / weights.sum()
+            k = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * q - 1))
+            starts = np.flatnonzero(np.concatenate([[True], k[1:] != k[:-1]]))
+            weights_merged = np.add.reduceat(weights, starts)
+            means = np.add.reduceat(means * weights, starts) / weights_merged
+            weights = weights_merged
+        self.means, self.weights = means, weights
+
+    def merge(self, other):
+        merged = QuantileSketch(max(self.compression, other.compression))
+        merged.means = np.concatenate([self.means, other.means])
+        merged.weights = np.concatenate([self.weights, other.weights])
+        merged._buffer = self._buffer + other._buffer
+        merged._buffered = self._buffered + other._buffered
+        merged.count = self.count + other.count
+        merged.min = min(self.min, other.min)
+        merged.max = max(self.max, other.max)
+        merged._compress(merge=len(merged.means) + merged._buffered > merged.capacity)
+        return merged
+
+    __add__ = merge
+
+    # Rank of every centroid centre, with the exact extremes pinned at ranks 0 and count
+    def _ranks(self):
+        self._compress(merge=False)
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return np.concatenate([[0.0], centers, [self.count]]), np.concatenate([[self.min], self.means, [self.max]])
+
+    def quantile(self, q):
+        ranks, values = self._ranks()
+        return np.interp(np.asarray(q, dtype=float) * self.count, ranks, values)
+
+    # Fraction of values <= x; 1 - cdf is the empirical exceedance probability
+    def cdf(self, x):
+        ranks, values = self._ranks()
+        return np.interp(np.asarray(x, dtype=float), values, ranks) / self.count
+
+    def plotting_positions(self, points=PLOT_POINTS):
+        """
+        Weibull plotting positions 100 m / (n + 1) answered from the sketch.
+
+        :param points: Maximum number of positions; longer series are evaluated at
+                       evenly spaced ranks m.
+        :return: (values, probabilities) sorted ascending, exact while the series
+                 fits in the buffer.
+        """
+        n = self.count
+        m = np.arange(1, n + 1) if n <= points else np.unique(np.round(np.linspace(1, n, points)))
+        ranks, values = self._ranks()
+        return np.interp(m - 0.5, ranks, values), 100 * m / (n + 1)
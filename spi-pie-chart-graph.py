@@ -1,34 +1,34 @@
 import pandas as pd
 import numpy as np
-from scipy.stats import lognorm, norm, gumbel_r
+from scipy.stats import norm
 import plotly.graph_objects as go
 import os
+from aggregation import group_totals, month_matrix
+from dashboard import publish_section
+from fitting import get_distribution, mixed_cdf
+from loader import default_cache_dir, load_precipitation
+from param_cache import PARAMETER_DB, ParameterCache
+from spi import DROUGHT_CATEGORIES, drought_events, spi_categories
 
 # Load the data
 file_path = r"C:\\Users\\yasar\\work_space\\disrubition-and-frequency\\data\\precipitation_data.csv"
-data = pd.read_csv(file_path)
-
-# Convert monthly data to long format
-monthly_data = data.melt(id_vars=["Year"], var_name="Month", value_name="Precipitation")
-monthly_data["Month"] = pd.Categorical(
-    monthly_data["Month"],
-    categories=["January", "February", "March", "April", "May", "June",
-                "July", "August", "September", "October", "November", "December"],
-    ordered=True
-)
-monthly_data.sort_values(by=["Year", "Month"], inplace=True)
-
-# Convert zero or negative values to a positive value
-monthly_data["Precipitation"] = monthly_data["Precipitation"].apply(lambda x: x if x > 0 else 0.01)
-
-# Define month groups
+# Zero-inflated mode: keep dry months at 0 and fit H(x) = q + (1 - q) G(x), with G fitted
+# on the positive values and q the fraction of zeros, instead of clamping zeros to 0.01
+zero_inflated = False
+
+# Wide and long frames come from the shared cache (long format, zero values clamped
+# unless zero_inflated is set)
+data, monthly_data = load_precipitation(file_path, zeros="mixed" if zero_inflated else "clamp")
+
+# Fitted parameters are cached in memory and in SQLite next to the data, shared by all scripts
+parameter_cache = ParameterCache(os.path.join(default_cache_dir(file_path), PARAMETER_DB))
+
+# Month-group totals from the (years x 12) matrix in one matrix multiply; groups spanning
+# the new year (Sep-Jun) belong to the hydrological year they end in
 def group_precipitation(data, groups, group_name):
-    results = []
-    for group in groups:
-        grouped_data = data[data["Month"].isin(group)].groupby("Year")["Precipitation"].sum().reset_index()
-        grouped_data.rename(columns={"Precipitation": group_name}, inplace=True)
-        results.append(grouped_data)
-    return results
+    matrix, years = month_matrix(data)
+    totals = group_totals(matrix, groups, years)
+    return [pd.DataFrame({"Year": years, group_name: totals[:, g]}) for g in range(len(groups))]
 
 # Define period groups
 one_month_groups = [["January"], ["February"], ["March"], ["April"], ["May"], ["June"], ["July"], ["August"], ["September"], ["October"], ["November"], ["December"]]
@@ -47,26 +47,27 @@ twelve_month_totals = group_precipitation(monthly_data, twelve_month_group, "12-
 # SPI calculation function
 def calculate_spi(data, column, method="log-normal"):
     values = data[column].dropna()
-    if method == "log-normal":
-        shape, loc, scale = lognorm.fit(values, floc=0)
-        cdf = lognorm.cdf(values, shape, loc, scale)
-    elif method == "normal":
-        mean, std = norm.fit(values)
-        cdf = norm.cdf(values, mean, std)
-    elif method == "gumbel":
-        loc, scale = gumbel_r.fit(values)
-        cdf = gumbel_r.cdf(values, loc, scale)
+    # Any registered distribution (fitting.REGISTRY); unknown names raise ValueError
+    distribution = get_distribution(method)
+    if zero_inflated:
+        q, params = parameter_cache.fit_mixed(values, method, refine=True)
+        # Dry totals sit at the centre of the zero probability mass, q / 2
+        cdf = np.where(values > 0, mixed_cdf(values, q, params, method), q / 2)
     else:
-        raise ValueError("Invalid method specified")
-    
+        params = parameter_cache.fit(values, method, refine=True)
+        cdf = distribution.dist.cdf(values, *params)
     cdf = np.clip(cdf, 1e-6, 1 - 1e-6)
     spi = norm.ppf(cdf)
-    data[f"SPI ({method})"] = spi
+    # Years without a total (e.g. the first year of a cross-year group) stay NaN
+    data.loc[values.index, f"SPI ({method})"] = spi
     return data
 
+# Define methods for SPI calculation (any name registered in fitting.REGISTRY, e.g. "gamma")
+methods = ["log-normal", "normal", "gumbel"]
+
 # Add methods for SPI calculations
 def calculate_all_spi(totals_list, column):
-    for method in ["log-normal", "normal", "gumbel"]:
+    for method in methods:
         for i, df in enumerate(totals_list):
             totals_list[i] = calculate_spi(df, column, method)
 
@@ -76,50 +77,40 @@ calculate_all_spi(six_month_totals, "6-Month Total")
 calculate_all_spi([ten_month_totals[0]], "10-Month Total")
 calculate_all_spi([twelve_month_totals[0]], "12-Month Total")
 
-# Drought categories
-categories = {
-    "Very Wet": 2.0,
-    "Wet": 1.5,
-    "Moderately Wet": 0.5,
-    "Moderately Dry": -0.5,
-    "Severely Dry": -1.5,
-    "Extremely Dry": -2.0
-}
+# Drought categories (lower SPI bound of each class, shared with spi.spi_categories)
+categories = DROUGHT_CATEGORIES
 
-# Function to classify SPI values into drought categories
-def classify_spi(data, method):
-    category_labels = []
-    for spi_value in data[f"SPI ({method})"]:
-        if spi_value >= categories["Very Wet"]:
-            category_labels.append("Very Wet")
-        elif spi_value >= categories["Wet"]:
-            category_labels.append("Wet")
-        elif spi_value >= categories["Moderately Wet"]:
-            category_labels.append("Moderately Wet")
-        elif spi_value >= categories["Moderately Dry"]:
-            category_labels.append("Moderately Dry")
-        elif spi_value >= categories["Severely Dry"]:
-            category_labels.append("Severely Dry")
-        else:
-            category_labels.append("Extremely Dry")
-    data[f"Category ({method})"] = category_labels
-    return data
+# Classify every SPI value of all windows and methods with a single np.digitize call
+def classify_all_spi(totals_lists, methods):
+    frames = [df for totals_list in totals_lists for df in totals_list]
+    labels = spi_categories(np.concatenate([df[[f"SPI ({method})" for method in methods]].to_numpy() for df in frames]))
+    start = 0
+    for df in frames:
+        for j, method in enumerate(methods):
+            df[f"Category ({method})"] = labels[start:start + len(df), j]
+        start += len(df)
+
+classify_all_spi([one_month_totals, three_month_totals, six_month_totals, [ten_month_totals[0]], [twelve_month_totals[0]]], methods)
 
 # Directory to save graphs
 output_dir = r"C:\\Users\\yasar\\work_space\\disrubition-and-frequency\\graphs\\spi-pie-chart-graph"
 os.makedirs(output_dir, exist_ok=True)
 
+# Report mode: put all figures into one combined station page instead of separate HTML files
+report_mode = False
+report_dir = r"C:\\Users\\yasar\\work_space\\disrubition-and-frequency\\graphs\\report"
+report_figures = []
+
 # Combine SPI pie charts with drought categories
 def plot_pie_chart_spi_with_categories(totals_list, group_names, method, title, file_name):
     fig = go.Figure()
 
     # Combine data for all groups into a single pie chart
-    category_counts = {"Very Wet": 0, "Wet": 0, "Moderately Wet": 0, "Moderately Dry": 0, "Severely Dry": 0, "Extremely Dry": 0}
+    category_counts = {category: 0 for category in categories}
     for df in totals_list:
-        classify_spi(df, method)
-        counts = df[f"Category ({method})"].value_counts().to_dict()
-        for category, count in counts.items():
-            category_counts[category] += count
+        counts = df[f"Category ({method})"].value_counts()
+        for category in category_counts:
+            category_counts[category] += int(counts.get(category, 0))
 
     fig.add_trace(go.Pie(
         labels=list(category_counts.keys()),
@@ -134,7 +125,10 @@ def plot_pie_chart_spi_with_categories(totals_list, group_names, method, title,
     )
 
     # Save the figure as HTML
-    fig.write_html(os.path.join(output_dir, f"{file_name}.html"))
+    if report_mode:
+        report_figures.append((title, fig))
+    else:
+        fig.write_html(os.path.join(output_dir, f"{file_name}.html"))
 
 # Group names for labeling
 one_month_group_names = [g[0] for g in one_month_groups]
@@ -143,9 +137,6 @@ six_month_group_names = ["-".join(g) for g in six_month_groups]
 ten_month_group_names = ["-".join(g) for g in ten_month_group]
 twelve_month_group_names = ["-".join(g) for g in twelve_month_group[0]]
 
-# Define methods for SPI calculation
-methods = ["log-normal", "normal", "gumbel"]
-
 # Plot for each method with drought categories
 for method in methods:
     # 1-Month SPI pie chart with categories
@@ -192,3 +183,27 @@ for method in methods:
         f"12-Month SPI Drought Analysis ({method.capitalize()})",
         f"12-Month_SPI_Drought_{method}"
     )
+
+if report_mode:
+    publish_section(report_dir, "SPI Drought", report_figures)
+
+# Drought events on the chronological SPI series of every window (groups follow each other
+# within a year), all methods of a window in one run-length pass
+window_totals = {
+    "1-Month": (one_month_totals, one_month_group_names),
+    "3-Month": (three_month_totals, three_month_group_names),
+    "6-Month": (six_month_totals, six_month_group_names),
+    "10-Month": ([ten_month_totals[0]], ten_month_group_names),
+    "12-Month": ([twelve_month_totals[0]], ["January-December"]),
+}
+drought_tables = []
+for window, (totals_list, group_names) in window_totals.items():
+    years = totals_list[0]["Year"].to_numpy()
+    series = np.stack([np.column_stack([df[f"SPI ({method})"] for df in totals_list]).ravel() for method in methods])
+    times = [f"{year} {name}" for year in years for name in group_names]
+    events = drought_events(series, times)
+    events.insert(0, "Window", window)
+    events.insert(0, "Method", np.asarray(methods)[events.pop("Series")])
+    drought_tables.append(events)
+pd.concat(drought_tables, ignore_index=True).to_csv("SPI_Drought_Events.csv", index=False)
+print("Saved: SPI_Drought_Events.csv")
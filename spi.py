@@ -0,0 +1,262 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+from aggregation import group_totals
+from fitting import DISTRIBUTIONS, cdf, fit
+from loader import MONTHS
+from preprocessing import clamp_zeros
+
+# Month groups used by the SPI scripts, keyed by aggregation window
+PERIOD_GROUPS = {
+    "1-Month": [[m] for m in MONTHS],
+    "3-Month": [MONTHS[0:3], MONTHS[3:6], MONTHS[6:9], MONTHS[9:12]],
+    "6-Month": [MONTHS[0:6], MONTHS[6:12]],
+    "10-Month": [MONTHS[8:12] + MONTHS[0:6]],
+    "12-Month": [MONTHS],
+}
+
+# Lower SPI bound of each drought category, as in the SPI scripts
+DROUGHT_CATEGORIES = {
+    "Very Wet": 2.0,
+    "Wet": 1.5,
+    "Moderately Wet": 0.5,
+    "Moderately Dry": -0.5,
+    "Severely Dry": -1.5,
+    "Extremely Dry": -2.0,
+}
+
+# Drought events are runs of SPI below this value (the Severely and Extremely Dry classes)
+DROUGHT_THRESHOLD = DROUGHT_CATEGORIES["Moderately Dry"]
+
+
+class SPIArray:
+    """
+    Minimal labelled array returned by compute_spi.
+
+    values has one axis per entry of dims and coords maps each dim to its labels.
+    """
+
+    def __init__(self, values, dims, coords):
+        self.values = values
+        self.dims = tuple(dims)
+        self.coords = {dim: np.asarray(coords[dim]) for dim in self.dims}
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    # Select by label, e.g. spi.sel(method="gumbel", station="A"); scalar labels drop the dim
+    def sel(self, **labels):
+        values = self.values
+        dims = []
+        coords = {}
+        axis = 0
+        for dim in self.dims:
+            if dim not in labels:
+                dims.append(dim)
+                coords[dim] = self.coords[dim]
+                axis += 1
+                continue
+            wanted = labels[dim]
+            positions = []
+            for label in np.atleast_1d(wanted):
+                found = np.flatnonzero(self.coords[dim] == label)
+                if len(found) == 0:
+                    raise KeyError(f"{label!r} not found in {dim}")
+                positions.append(found[0])
+            if np.ndim(wanted) == 0:
+                values = np.take(values, positions[0], axis=axis)
+            else:
+                values = np.take(values, positions, axis=axis)
+                dims.append(dim)
+                coords[dim] = self.coords[dim][positions]
+                axis += 1
+        return SPIArray(values, dims, coords)
+
+    # Long table with one row per element, one column per dim plus an SPI column
+    def to_frame(self, name="SPI"):
+        index = pd.MultiIndex.from_product([self.coords[d] for d in self.dims], names=self.dims)
+        return pd.DataFrame({name: self.values.ravel()}, index=index).reset_index()
+
+
+# Convert a wide Year x January..December frame to a (1 x years x 12) array
+def station_array(data):
+    return data[MONTHS].to_numpy(dtype=float)[np.newaxis, :, :], data["Year"].to_numpy()
+
+
+# Month-group totals (stations, years, 12) -> (stations, groups, years), see aggregation.group_totals
+def month_group_totals(precipitation, groups, years=None):
+    return np.swapaxes(group_totals(precipitation, groups, years), -1, -2)
+
+
+# SPI along the last axis of totals, fitted separately for every leading index
+def spi_batch(totals, method, refine=False):
+    probabilities = cdf(totals, fit(totals, method, refine=refine), method)
+    probabilities = np.clip(probabilities, 1e-6, 1 - 1e-6)
+    return norm.ppf(probabilities)
+
+
+def compute_spi(precipitation, years=None, stations=None, windows=None, methods=DISTRIBUTIONS, refine=True):
+    """
+    Computes SPI for every station, aggregation window and distribution in batched calls.
+
+    :param precipitation: Array of shape (stations, years, 12) with monthly totals; zero
+                          months are clamped to the 0.01 floor as in the SPI scripts,
+                          missing (NaN) months stay missing.
+    :param years: Integer years of the rows (defaults to 0..n-1); cross-year groups take
+                  their early months from the previous calendar year, NaN where it is missing.
+    :param stations: Station labels (defaults to 0..n-1).
+    :param windows: Mapping of window name to month groups (defaults to PERIOD_GROUPS).
+    :param methods: Distributions to fit.
+    :param refine: Refine the fast Gumbel fit to the maximum likelihood estimate (the
+                   default, matching gumbel_r.fit in the baseline scripts).
+    :return: SPIArray with dims (method, station, window, group, year); groups a window
+             does not have are NaN.
+    """
+    precipitation = np.asarray(precipitation, dtype=float)
+    precipitation = np.where(np.isnan(precipitation), np.nan, clamp_zeros(precipitation))
+    n_stations, n_years, _ = precipitation.shape
+    windows = windows or PERIOD_GROUPS
+    years = np.arange(n_years) if years is None else years
+    stations = np.arange(n_stations) if stations is None else stations
+    n_groups = max(len(groups) for groups in windows.values())
+
+    totals = np.full((n_stations, len(windows), n_groups, n_years), np.nan)
+    for w, groups in enumerate(windows.values()):
+        totals[:, w, :len(groups), :] = month_group_totals(precipitation, groups, years)
+
+    values = np.full((len(methods),) + totals.shape, np.nan)
+    filled = ~np.all(np.isnan(totals), axis=-1)
+    for k, method in enumerate(methods):
+        values[k][filled] = spi_batch(totals[filled], method, refine)
+
+    return SPIArray(values, ("method", "station", "window", "group", "year"), {
+        "method": list(methods),
+        "station": stations,
+        "window": list(windows),
+        "group": np.arange(n_groups),
+        "year": years,
+    })
+
+
+# k-month running sums along the last axis of a continuous monthly series, for every k at once:
+# (..., months) -> (..., scales, months), windows that are incomplete or contain NaN are NaN
+def running_sums(series, scales):
+    series = np.asarray(series, dtype=float)
+    n = series.shape[-1]
+    missing = np.isnan(series)
+    zero = np.zeros(series.shape[:-1] + (1,))
+    cumulative = np.concatenate([zero, np.cumsum(np.where(missing, 0.0, series), axis=-1)], axis=-1)
+    cumulative_missing = np.concatenate([zero, np.cumsum(missing, axis=-1)], axis=-1)
+
+    scales = np.asarray(scales)
+    end = np.arange(1, n + 1)
+    start = end[np.newaxis, :] - scales[:, np.newaxis]
+    complete = start >= 0
+    start = np.maximum(start, 0)
+    totals = cumulative[..., np.newaxis, end] - cumulative[..., start]
+    gaps = cumulative_missing[..., np.newaxis, end] - cumulative_missing[..., start]
+    return np.where(complete & (gaps == 0), totals, np.nan)
+
+
+# Running sums over the year-month series: (..., years, 12) -> (..., scales, years, 12)
+def running_totals(precipitation, scales):
+    precipitation = np.asarray(precipitation, dtype=float)
+    totals = running_sums(precipitation.reshape(precipitation.shape[:-2] + (-1,)), scales)
+    return totals.reshape(totals.shape[:-1] + precipitation.shape[-2:])
+
+
+def compute_spi_k(precipitation, scales=(1, 3, 6, 12), years=None, stations=None,
+                  methods=DISTRIBUTIONS, refine=True):
+    """
+    Computes standard SPI-k from k-month running sums, fitted per calendar month.
+
+    :param precipitation: Array of shape (stations, years, 12) with monthly totals; zero
+                          months are clamped to the 0.01 floor, missing (NaN) months stay
+                          missing.
+    :param scales: Accumulation periods in months (any k from 1 to 48).
+    :param years: Year labels (defaults to 0..n-1).
+    :param stations: Station labels (defaults to 0..n-1).
+    :param methods: Distributions to fit.
+    :param refine: Refine the fast Gumbel fit to the maximum likelihood estimate (default).
+    :return: SPIArray with dims (method, station, scale, year, month); months whose
+             window reaches before the first year are NaN.
+    """
+    precipitation = np.asarray(precipitation, dtype=float)
+    precipitation = np.where(np.isnan(precipitation), np.nan, clamp_zeros(precipitation))
+    n_stations, n_years, _ = precipitation.shape
+    years = np.arange(n_years) if years is None else years
+    stations = np.arange(n_stations) if stations is None else stations
+
+    # Fit along years for each calendar month: (stations, scales, 12, years)
+    totals = np.swapaxes(running_totals(precipitation, scales), -1, -2)
+    values = np.full((len(methods),) + totals.shape, np.nan)
+    for k, method in enumerate(methods):
+        values[k] = spi_batch(totals, method, refine)
+
+    return SPIArray(np.swapaxes(values, -1, -2), ("method", "station", "scale", "year", "month"), {
+        "method": list(methods),
+        "station": stations,
+        "scale": list(scales),
+        "year": years,
+        "month": MONTHS,
+    })
+
+
+# Drought category label of every SPI value (NaN is left unclassified as an empty string);
+# values below the Severely Dry bound are Extremely Dry, as in classify_spi
+def spi_categories(values):
+    values = np.asarray(values, dtype=float)
+    labels = np.array(list(DROUGHT_CATEGORIES)[::-1] + [""])
+    bounds = np.array(list(DROUGHT_CATEGORIES.values())[::-1][1:])
+    codes = np.digitize(values, bounds)
+    return labels[np.where(np.isnan(values), len(labels) - 1, codes)]
+
+
+def drought_events(spi, times=None, threshold=DROUGHT_THRESHOLD):
+    """
+    Run-length drought events along the last axis of spi, for every series at once.
+
+    Each series is padded with a non-drought step on both sides and flattened, so
+    run starts and ends come from one diff and no run crosses into the next series.
+
+    :param spi: Array (..., steps) of SPI in time order; NaN breaks a run.
+    :param times: Labels of the steps (defaults to 0..steps-1).
+    :param threshold: A step is in drought when SPI < threshold.
+    :return: DataFrame with Series (flat index over the leading axes), Start, End,
+             Duration (steps), Severity (sum of threshold - SPI), Intensity
+             (Severity / Duration), Peak (lowest SPI) and Interarrival (steps since
+             the start of the previous event of the same series).
+    """
+    spi = np.asarray(spi, dtype=float)
+    steps = spi.shape[-1]
+    series = spi.reshape(-1, steps)
+    times = np.arange(steps) if times is None else np.asarray(times)
+
+    padded = np.full((len(series), steps + 2), np.nan)
+    padded[:, 1:-1] = series
+    padded = padded.ravel()
+    dry = np.concatenate([padded < threshold, [False]])
+    edges = np.diff(dry.astype(np.int8))
+    starts = np.flatnonzero(edges == 1) + 1
+    ends = np.flatnonzero(edges == -1) + 1
+
+    deficit = np.concatenate([[0.0], np.cumsum(np.where(dry[:-1], threshold - padded, 0.0))])
+    severity = deficit[ends] - deficit[starts]
+    duration = ends - starts
+    peak = np.minimum.reduceat(padded, np.column_stack([starts, ends]).ravel())[::2] if len(starts) else np.empty(0)
+
+    row, column = np.divmod(starts, steps + 2)
+    column = column - 1
+    interarrival = np.where(np.concatenate([[False], row[1:] == row[:-1]]),
+                            np.diff(np.concatenate([[0], column])), np.nan)
+    return pd.DataFrame({
+        "Series": row,
+        "Start": times[column],
+        "End": times[column + duration - 1],
+        "Duration": duration,
+        "Severity": severity,
+        "Intensity": severity / duration,
+        "Peak": peak,
+        "Interarrival": interarrival,
+    })
@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from loader import MONTHS
+
+STORE_VERSION = 1
+
+INDEX_FILE = "index.json"
+
+FREQUENCIES = ("monthly", "daily")
+
+DEFAULT_CHUNKSIZE = 1_000_000
+
+
+def _array_file(store_dir, frequency):
+    return os.path.join(store_dir, f"{frequency}.npy")
+
+
+def _read_index(store_dir):
+    index_file = os.path.join(store_dir, INDEX_FILE)
+    if not os.path.exists(index_file):
+        return {"version": STORE_VERSION}
+    with open(index_file) as f:
+        return json.load(f)
+
+
+def _write_index(store_dir, frequency, entry):
+    index = _read_index(store_dir)
+    index["version"] = STORE_VERSION
+    index[frequency] = entry
+    tmp_file = os.path.join(store_dir, INDEX_FILE + ".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_file, os.path.join(store_dir, INDEX_FILE))
+
+
+# Month column of a long file as 0..11, from names ("January") or numbers (1..12)
+def _month_codes(months):
+    if pd.api.types.is_numeric_dtype(months):
+        return months.to_numpy(dtype=int) - 1
+    return pd.Categorical(months, categories=MONTHS).codes.astype(int)
+
+
+def convert_station_files(files, store_dir):
+    """
+    Converts wide Year x January..December station files to the monthly store.
+
+    Files are read one at a time into a (stations, years, 12) memory-mapped array,
+    so peak memory is one station file whatever the number of stations.
+
+    :param files: Mapping of station label to CSV path (the precipitation_data.csv layout).
+    :param store_dir: Output directory.
+    :return: Path of the monthly array file.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    stations = [str(station) for station in files]
+
+    # First pass reads only the Year column to size the array
+    first_year, last_year = None, None
+    for file_path in files.values():
+        years = pd.read_csv(file_path, usecols=["Year"])["Year"]
+        first_year = years.min() if first_year is None else min(first_year, years.min())
+        last_year = years.max() if last_year is None else max(last_year, years.max())
+
+    array_file = _array_file(store_dir, "monthly")
+    shape = (len(stations), int(last_year - first_year + 1), len(MONTHS))
+    monthly = np.lib.format.open_memmap(array_file, mode="w+", dtype=float, shape=shape)
+    monthly[:] = np.nan
+    for row, file_path in enumerate(files.values()):
+        data = pd.read_csv(file_path)
+        monthly[row, data["Year"].to_numpy() - first_year] = data[MONTHS].to_numpy(dtype=float)
+    monthly.flush()
+    del monthly
+
+    _write_index(store_dir, "monthly", {"stations": stations, "first_year": int(first_year)})
+    return array_file
+
+
+def convert_long_csv(file_path, store_dir, frequency="monthly", chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Converts a long multi-station CSV to the store in two chunked passes.
+
+    Monthly files have Station, Year, Month and Precipitation columns; daily files
+    have Station, Date and Precipitation. The first pass collects the stations and
+    the date range, the second writes each chunk into the memory-mapped array, so
+    the CSV never has to fit in memory.
+
+    :param file_path: Long CSV file.
+    :param store_dir: Output directory.
+    :param frequency: "monthly" -> (stations, years, 12) or "daily" -> (stations, days).
+    :param chunksize: Rows read per chunk.
+    :return: Path of the array file.
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError("Invalid frequency specified")
+    os.makedirs(store_dir, exist_ok=True)
+    time_columns = ["Year", "Month"] if frequency == "monthly" else ["Date"]
+
+    stations = set()
+    first, last = None, None
+    for chunk in pd.read_csv(file_path, usecols=["Station"] + time_columns[:1], chunksize=chunksize):
+        stations.update(chunk["Station"].astype(str).unique())
+        times = chunk[time_columns[0]] if frequency == "monthly" else pd.to_datetime(chunk["Date"])
+        first = times.min() if first is None else min(first, times.min())
+        last = times.max() if last is None else max(last, times.max())
+    stations = pd.Index(sorted(stations))
+
+    if frequency == "monthly":
+        shape = (len(stations), int(last - first + 1), len(MONTHS))
+    else:
+        first, last = np.datetime64(first.date(), "D"), np.datetime64(last.date(), "D")
+        shape = (len(stations), int((last - first).astype(int)) + 1)
+
+    array_file = _array_file(store_dir, frequency)
+    values = np.lib.format.open_memmap(array_file, mode="w+", dtype=float, shape=shape)
+    values[:] = np.nan
+    for chunk in pd.read_csv(file_path, usecols=["Station", "Precipitation"] + time_columns, chunksize=chunksize):
+        rows = stations.get_indexer(chunk["Station"].astype(str))
+        if frequency == "monthly":
+            values[rows, chunk["Year"].to_numpy() - first, _month_codes(chunk["Month"])] = chunk["Precipitation"]
+        else:
+            days = (pd.to_datetime(chunk["Date"]).to_numpy().astype("datetime64[D]") - first).astype(int)
+            values[rows, days] = chunk["Precipitation"]
+    values.flush()
+    del values
+
+    if frequency == "monthly":
+        entry = {"stations": list(stations), "first_year": int(first)}
+    else:
+        entry = {"stations": list(stations), "first_date": str(first)}
+    _write_index(store_dir, frequency, entry)
+    return array_file
+
+
+class ColumnarStore:
+    """
+    Read side of the store: the arrays are opened with mmap_mode="r", so station
+    slices are views and only the pages that are touched are read from disk.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.index = _read_index(store_dir)
+        if self.index.get("version") != STORE_VERSION:
+            raise ValueError("Unsupported store version")
+        self._arrays = {}
+        self._stations = {frequency: pd.Index(self.index[frequency]["stations"])
+                          for frequency in FREQUENCIES if frequency in self.index}
+
+    def array(self, frequency="monthly"):
+        if frequency not in self._stations:
+            raise ValueError("Invalid frequency specified")
+        if frequency not in self._arrays:
+            self._arrays[frequency] = np.load(_array_file(self.store_dir, frequency), mmap_mode="r")
+        return self._arrays[frequency]
+
+    def stations(self, frequency="monthly"):
+        return self._stations[frequency]
+
+    @property
+    def years(self):
+        first_year = self.index["monthly"]["first_year"]
+        return np.arange(first_year, first_year + self.array("monthly").shape[1])
+
+    @property
+    def dates(self):
+        first_date = np.datetime64(self.index["daily"]["first_date"], "D")
+        return first_date + np.arange(self.array("daily").shape[1])
+
+    # Zero-copy view of one station: (years, 12) monthly or (days,) daily
+    def station(self, station, frequency="monthly"):
+        return self.array(frequency)[self.stations(frequency).get_loc(str(station))]
+
+    # Zero-copy view of a contiguous block of stations (a list of labels would copy)
+    def station_range(self, start, stop, frequency="monthly"):
+        return self.array(frequency)[start:stop]
+
+    # Wide Year x January..December frame of one station (the precipitation_data.csv
+    # layout), built from its view; years with no data at all are left out
+    def station_frame(self, station):
+        values = np.asarray(self.station(station), dtype=float)
+        observed = ~np.all(np.isnan(values), axis=1)
+        data = pd.DataFrame(values[observed], columns=MONTHS)
+        data.insert(0, "Year", self.years[observed])
+        return data
+
+    def iter_chunks(self, chunk_stations=256, frequency="monthly"):
+        """
+        Yields (station labels, view) blocks of chunk_stations stations.
+
+        Views can be passed straight to spi.compute_spi, incremental.calibrate or
+        fitting.fit; the pages of earlier blocks can be dropped by the OS, so memory
+        stays flat as the archive grows.
+        """
+        stations = self.stations(frequency)
+        for start in range(0, len(stations), chunk_stations):
+            stop = min(start + chunk_stations, len(stations))
+            yield stations[start:stop], self.station_range(start, stop, frequency)
+
+
+def open_store(store_dir):
+    return ColumnarStore(store_dir)
+
+
+# Content key of a store: the index plus the size and modification time of every array,
+# so large archives are not read just to decide whether they changed
+def store_hash(store_dir):
+    digest = hashlib.sha256()
+    with open(os.path.join(store_dir, INDEX_FILE), "rb") as f:
+        digest.update(f.read())
+    for frequency in FREQUENCIES:
+        array_file = _array_file(store_dir, frequency)
+        if os.path.exists(array_file):
+            stat = os.stat(array_file)
+            digest.update(f"{frequency}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
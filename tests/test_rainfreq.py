@@ -0,0 +1,44 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rainfreq import _aggregate, _classify, _fit, _spi
+
+
+def _loaded(years=30, seed=1):
+    rng = np.random.default_rng(seed)
+    precipitation = rng.gamma(2.0, 30.0, size=(1, years, 12))
+    precipitation[0, rng.random((years, 12)) < 0.1] = 0.0
+    return {"precipitation": precipitation, "years": np.arange(1990, 1990 + years)}
+
+
+def test_zero_inflated_cross_year_group_keeps_missing_total():
+    config = {"methods": ["gumbel"], "zero_inflated": True}
+    aggregated = _aggregate(config, _loaded())
+    spi = _spi(config, aggregated, _fit(config, aggregated))
+
+    ten_month = spi[spi["Window"] == "10-Month"].sort_values("Year")
+    assert np.isnan(ten_month["Total"].iloc[0])
+    assert np.isnan(ten_month["SPI"].iloc[0])
+    assert ten_month["SPI"].iloc[1:].notna().all()
+
+    # The missing year is not counted in any drought category
+    counts = _classify(config, spi)
+    row = counts[(counts["Method"] == "gumbel") & (counts["Window"] == "10-Month")]
+    assert row.drop(columns=["Method", "Window"]).to_numpy().sum() == len(ten_month) - 1
+
+
+def test_zero_inflated_dry_totals_get_half_the_zero_probability():
+    loaded = _loaded()
+    loaded["precipitation"][0, :5, 0] = 0.0
+    config = {"methods": ["gumbel"], "zero_inflated": True}
+    aggregated = _aggregate(config, loaded)
+    spi = _spi(config, aggregated, _fit(config, aggregated))
+
+    january = spi[(spi["Window"] == "1-Month") & (spi["Group"] == 1)]
+    dry = january[january["Total"] == 0]
+    assert len(dry) >= 5
+    assert np.allclose(dry["SPI"], dry["SPI"].iloc[0])
+    assert dry["SPI"].notna().all()
@@ -1,11 +1,12 @@
 import pandas as pd
 import matplotlib.pyplot as plt
+from loader import load_precipitation
 
 # Specify the full path of the CSV file
 file_path = r"C:\Users\yasar\work_space\disrubition-and-frequency\data\precipitation_data.csv"
 
 # Read the CSV file
-df = pd.read_csv(file_path)
+df, _ = load_precipitation(file_path)
 
 # Use the Year column as the first column in the index
 df.set_index('Year', inplace=True)